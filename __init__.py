@@ -1,9 +1,14 @@
-from .dustrider import Dustrider
-from .pid import PID
-from .pure_pursuit import PurePursuit
-from .road_runner import RoadRunner
-from .spline_bot import RoadSprinter
-from .spline_bot2 import RoadSprinter as RoadSprinter2
+from importlib import import_module
+
+# The bots are imported on first access, so importing the package does not pull in numpy, pygame and the game
+BOTS = {
+    'Dustrider': ('.dustrider', 'Dustrider'),
+    'PID': ('.pid', 'PID'),
+    'PurePursuit': ('.pure_pursuit', 'PurePursuit'),
+    'RoadRunner': ('.road_runner', 'RoadRunner'),
+    'RoadSprinter': ('.spline_bot', 'RoadSprinter'),
+    'RoadSprinter2': ('.spline_bot2', 'RoadSprinter'),
+}
 
 __all__ = [
     'Dustrider',
@@ -13,3 +18,16 @@ __all__ = [
     'RoadSprinter',
     'RoadSprinter2',
 ]
+
+
+def __getattr__(name):
+    if name not in BOTS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    module, attribute = BOTS[name]
+    bot = getattr(import_module(module, __name__), attribute)
+    globals()[name] = bot
+    return bot
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
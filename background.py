@@ -0,0 +1,165 @@
+import weakref
+from argparse import Namespace
+from multiprocessing import Process
+from multiprocessing.shared_memory import SharedMemory
+from time import sleep
+from typing import Optional, Tuple, Type
+
+import numpy as np
+from pygame import Vector2
+
+from ...bot import Bot
+from ...linear_math import Rotation, Transform
+from ...track import Track
+
+# Shared memory layout, all float64. The state block is written by the game loop and the plan block by the worker;
+# each starts with a sequence number that is odd while the block is being written.
+# state: sequence, stop flag, tick, next waypoint, rotation columns (4), position (2), velocity (2)
+STATE_SIZE = 12
+# plan: sequence, tick of the state it was planned from, number of commands, number of trajectory points, target
+# speed, then the commands (2, horizon) and the trajectory (horizon + 1, 2)
+PLAN_HEADER = 5
+
+# Seconds the worker sleeps when there is no new state to plan from
+POLL = 0.0005
+# Attempts to read a plan that is not being written at the same moment, before using the previous one
+READ_ATTEMPTS = 3
+
+
+def plan_size(horizon: int) -> int:
+    return PLAN_HEADER + 2 * horizon + 2 * (horizon + 1)
+
+
+class Plan:
+    """Commands (2, m) from the state of tick `tick` on, the trajectory they were expected to drive and the target
+    speed at its end."""
+    __slots__ = ('tick', 'commands', 'trajectory', 'target_speed')
+
+    def __init__(self, tick: int, commands: np.ndarray, trajectory: np.ndarray, target_speed: float):
+        self.tick = tick
+        self.commands = commands
+        self.trajectory = trajectory
+        self.target_speed = target_speed
+
+    def at(self, tick: int) -> Tuple[float, float]:
+        """The command for a later tick; the last command is held when the plan runs out."""
+        throttle, steering_command = self.commands[:, min(tick - self.tick, self.commands.shape[1] - 1)]
+        return float(throttle), float(steering_command)
+
+
+def work(name: str, bot_class: Type[Bot], track: Track, config: Namespace):
+    """Plan with a bot of its own from every new state in the shared memory, until the stop flag is set."""
+    memory = SharedMemory(name)
+    state = np.ndarray(STATE_SIZE, np.float64, memory.buf)
+    plan = np.ndarray(plan_size(config.n), np.float64, memory.buf, STATE_SIZE * 8)
+    bot = bot_class(track)
+    bot.config = config
+    bot.init()
+
+    planned = -1.
+    try:
+        while not state[1]:
+            sequence = state[0]
+            observed = state.copy()
+            if sequence % 2 or state[0] != sequence or observed[2] == planned:
+                sleep(POLL)
+                continue
+
+            tick, next_waypoint, c0x, c0y, c1x, c1y, px, py, vx, vy = observed[2:]
+            position = Transform(Rotation(Vector2(c0x, c0y), Vector2(c1x, c1y)), Vector2(px, py))
+            commands, trajectory, target_speed = bot.search(int(next_waypoint), position, Vector2(vx, vy))
+
+            m, start = commands.shape[1], PLAN_HEADER + 2 * config.n
+            plan[0] += 1
+            plan[1:PLAN_HEADER] = tick, m, len(trajectory), target_speed
+            plan[PLAN_HEADER:PLAN_HEADER + 2 * m] = commands.ravel()
+            plan[start:start + trajectory.size] = trajectory.ravel()
+            plan[0] += 1
+            planned = tick
+    finally:
+        del state, plan
+        memory.close()
+
+
+class BackgroundPlanner:
+    """Runs the planning of a bot in a worker process, always from the latest state the game loop observed.
+
+    The game loop hands over the state and takes the freshest plan through shared memory, guarded by sequence
+    numbers instead of locks, so it never waits for the worker, however long a plan takes. The worker plans with a
+    copy of the bot that is made when it starts; bots have to implement `search(next_waypoint, position, velocity)`,
+    which returns the command sequence, the trajectory and the target speed of the best candidate. The worker is
+    started by `start`, or else on the first observed state, and stopped by `close` or when the planner is garbage
+    collected.
+    """
+
+    def __init__(self, bot: Bot):
+        self.bot_class = type(bot)
+        self.track = bot.track
+        self.config = Namespace(**{**vars(bot.config), 'asynchronous': False})
+        self.horizon = self.config.n
+        self.memory: Optional[SharedMemory] = None
+        self.process: Optional[Process] = None
+        self.plan: Optional[Plan] = None
+        self._finalizer = None
+
+    def start(self):
+        self.memory = SharedMemory(create=True, size=8 * (STATE_SIZE + plan_size(self.horizon)))
+        self.state = np.ndarray(STATE_SIZE, np.float64, self.memory.buf)
+        self.state[:] = 0
+        self.shared_plan = np.ndarray(plan_size(self.horizon), np.float64, self.memory.buf, STATE_SIZE * 8)
+        self.shared_plan[:] = 0
+        self.process = Process(target=work, args=(self.memory.name, self.bot_class, self.track, self.config),
+                               daemon=True)
+        self.process.start()
+        self._finalizer = weakref.finalize(self, stop, self.memory, self.process)
+
+    def close(self):
+        """Stop the worker. Observing another state starts a new one."""
+        if self.process is not None:
+            # the shared memory can only be closed when no arrays refer to it any more
+            self.state = self.shared_plan = None
+            self._finalizer()
+            self.memory = self.process = None
+
+    def observe(self, tick: int, next_waypoint: int, position: Transform, velocity: Vector2):
+        """Hand the state of a tick over to the worker, replacing the previous one if it was not planned from yet."""
+        if self.process is None:
+            self.start()
+        state = self.state
+        (c0x, c0y), (c1x, c1y) = position.M.cols
+        state[0] += 1
+        state[2:] = tick, next_waypoint, c0x, c0y, c1x, c1y, position.p.x, position.p.y, velocity.x, velocity.y
+        state[0] += 1
+
+    def latest(self) -> Optional[Plan]:
+        """The freshest complete plan, or None while the worker has not finished one yet."""
+        if self.process is None:
+            return None
+        shared = self.shared_plan
+        for _ in range(READ_ATTEMPTS):
+            sequence = shared[0]
+            if not sequence or sequence % 2:
+                continue
+            if self.plan is not None and shared[1] == self.plan.tick:
+                return self.plan
+            values = shared.copy()
+            if shared[0] == sequence:
+                tick, m, length, target_speed = values[1:PLAN_HEADER]
+                m, length, start = int(m), int(length), PLAN_HEADER + 2 * self.horizon
+                self.plan = Plan(int(tick), values[PLAN_HEADER:PLAN_HEADER + 2 * m].reshape(2, m),
+                                 values[start:start + 2 * length].reshape(length, 2), target_speed)
+                break
+        return self.plan
+
+
+def stop(memory: SharedMemory, process: Process):
+    np.ndarray(STATE_SIZE, np.float64, memory.buf)[1] = 1
+    process.join(1.)
+    if process.is_alive():
+        process.terminate()
+    try:
+        memory.close()
+    except BufferError:
+        # at exit, the planner may still have arrays on the memory
+        pass
+    memory.unlink()
@@ -0,0 +1,81 @@
+import os
+import sys
+import tempfile
+from argparse import ArgumentParser
+from importlib import import_module
+from math import inf, log
+from typing import Dict, Type
+
+from .tracks import synthetic_track
+from .. import BOTS, cache
+from ..headless import race
+from ..instrumentation import instrumentation
+from ..recording import Recording, replay
+from ....bot import Bot
+from ....constants import framerate
+from ....track import Track
+
+SIZES = [1000, 10000, 100000]
+
+# Phases that take less than this many seconds longer on the largest track than on the smallest one are not checked
+NOISE = 5e-6
+
+
+def phase_times(bot_class: Type[Bot], track: Track, frames: int, repeat: int) -> Dict[str, float]:
+    """Mean duration of every instrumented phase of a bot, over the inputs of a race that it drove itself, replayed
+    to fresh bots. Every duration is the best of `repeat` replays."""
+    best = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'race.rec')
+        race(bot_class, track, laps=sys.maxsize, max_time=frames / framerate, recording=path)
+        recording = Recording(path)
+        for _ in range(repeat):
+            bot = bot_class(track)
+            bot.init()
+            instrumentation.reset()
+            instrumentation.enable(report_at_exit=False)
+            try:
+                replay(bot, recording)
+            finally:
+                instrumentation.disable()
+            for (_, phase), histogram in instrumentation.histograms.items():
+                best[phase] = min(best.get(phase, inf), histogram.total / histogram.count / 1e9)
+        del recording
+    instrumentation.reset()
+    return best
+
+
+def main():
+    parser = ArgumentParser(description='Time the phases of a frame of the bots on synthetic tracks of growing size, '
+                                        'and fail if any of them grows faster than the logarithm of the size.')
+    parser.add_argument('bots', nargs='*', default=list(BOTS))
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='waypoint counts of the tracks')
+    parser.add_argument('--frames', type=int, default=600, help='frames driven on every track')
+    parser.add_argument('--repeat', type=int, default=3, help='replays of every race, the best one counts')
+    parser.add_argument('--slack', type=float, default=1.5,
+                        help='allowed growth on top of the logarithm of the size, as a factor')
+    args = parser.parse_args()
+
+    # the preprocessing of a big track is not what is measured, but it should not fill the cache either
+    cache.CACHE_DIR = ''
+    bots = import_module('..', __package__)
+    sizes = sorted(args.sizes)
+    allowed = args.slack * log(sizes[-1]) / log(sizes[0])
+    print(f'{"bot":<14}{"phase":<18}' + ''.join(f'{size:>10}' for size in sizes) + f'{"growth":>9}')
+    failures = []
+    for name in args.bots:
+        times = [phase_times(getattr(bots, name), synthetic_track(size), args.frames, args.repeat) for size in sizes]
+        for phase in times[0]:
+            growth = times[-1][phase] / times[0][phase]
+            print(f'{name:<14}{phase:<18}' + ''.join(f'{1e6 * t[phase]:>8.1f}us' for t in times) + f'{growth:>9.2f}')
+            if growth > allowed and times[-1][phase] - times[0][phase] > NOISE:
+                failures.append(f'{name} {phase}')
+
+    if failures:
+        sys.exit(f'Slower than logarithmic from {sizes[0]} to {sizes[-1]} waypoints (growth over {allowed:.2f}): '
+                 f'{", ".join(failures)}')
+    print(f'Every phase grew by at most {allowed:.2f} from {sizes[0]} to {sizes[-1]} waypoints')
+
+
+if __name__ == '__main__':
+    main()
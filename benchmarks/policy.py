@@ -0,0 +1,58 @@
+import shutil
+import tempfile
+from argparse import ArgumentParser
+from time import perf_counter
+
+from .tracks import synthetic_track
+from .. import cache
+from ..dustrider import Dustrider
+from ..headless import race
+from ..policy_table import PolicyTable
+
+
+class TableDustrider(Dustrider):
+    """Dustrider with planner='table' that counts the frames the table answers."""
+
+    def __init__(self, track, interpolate: bool = False):
+        super().__init__(track)
+        self.config.planner = 'table'
+        self.config.table_interpolate = interpolate
+        self.hits = self.misses = 0
+
+    def search_table(self, next_waypoint, position, velocity, dt):
+        result = super().search_table(next_waypoint, position, velocity, dt)
+        if self.candidates_evaluated:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+
+def main():
+    parser = ArgumentParser(description='Build the policy table of Dustrider on synthetic tracks, and compare a lap '
+                                        'driven with planner="table" to a lap driven with the live grid search.')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2, 3, 4], help='seeds of the tracks')
+    parser.add_argument('--waypoints', type=int, default=50)
+    parser.add_argument('--interpolate', action='store_true', help='interpolate between the grid states')
+    parser.add_argument('--workers', type=int, help='processes that build the table, all CPUs by default')
+    args = parser.parse_args()
+
+    # the build is part of what is measured: start from an empty cache, which init then loads the table from
+    cache.CACHE_DIR = tempfile.mkdtemp()
+    print(f'{"seed":>4}{"build":>9}{"hits":>7}{"table":>10}{"grid":>10}{"table lap":>11}{"grid lap":>10}')
+    for seed in args.seeds:
+        track = synthetic_track(args.waypoints, seed)
+        grid = race(Dustrider, track)
+        bot = TableDustrider(track, args.interpolate)
+        start = perf_counter()
+        PolicyTable.of(bot, args.interpolate, args.workers)
+        build = perf_counter() - start
+        table = race(bot, track)
+        print(f'{seed:>4}{build:>8.1f}s{100 * bot.hits / (bot.hits + bot.misses):>6.0f}%'
+              f'{1e3 * table.compute_times.mean():>8.3f}ms{1e3 * grid.compute_times.mean():>8.3f}ms'
+              f'{table.race_time:>10.2f}s{grid.race_time:>9.2f}s')
+    shutil.rmtree(cache.CACHE_DIR)
+
+
+if __name__ == '__main__':
+    main()
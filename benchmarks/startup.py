@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+from statistics import median
+from typing import Dict, List
+
+PACKAGE = __package__.rsplit('.', 1)[0]
+BOTS = ['Dustrider', 'PID', 'PurePursuit', 'RoadRunner', 'RoadSprinter', 'RoadSprinter2']
+
+# Every measurement runs in a fresh interpreter, so nothing is imported or initialized yet. The parent package of
+# the bots is imported before the clock starts, it is the same for every version of the bots.
+IMPORT_SCRIPT = '''
+import json, sys, time
+import {parent}
+start = time.perf_counter()
+import {package}
+print(json.dumps({{'import': time.perf_counter() - start, 'numpy': 'numpy' in sys.modules,
+                  'pygame': 'pygame' in sys.modules}}))
+'''
+
+BOT_SCRIPT = '''
+import json, time
+import {parent}
+start = time.perf_counter()
+from {package} import {bot} as bot_class
+imported = time.perf_counter()
+from {package}.benchmarks.tracks import synthetic_track
+from {package}.headless import start_position
+track = synthetic_track({waypoints})
+position, velocity, next_waypoint = start_position(track)
+start_construct = time.perf_counter()
+bot = bot_class(track)
+constructed = time.perf_counter()
+bot.compute_commands(next_waypoint, position, velocity)
+first = time.perf_counter()
+bot.compute_commands(next_waypoint, position, velocity)
+second = time.perf_counter()
+print(json.dumps({{'import': imported - start, 'construct': constructed - start_construct,
+                  'first_frame': first - constructed, 'second_frame': second - first}}))
+'''
+
+
+def run(script: str, cache_dir: str) -> Dict:
+    env = dict(os.environ, RACER_CACHE_DIR=cache_dir, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    output = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def measure(script: str, repeat: int, cold: bool) -> Dict[str, float]:
+    """Median of every timing over `repeat` runs, with an empty cache directory per run if `cold`."""
+    runs: List[Dict] = []
+    with tempfile.TemporaryDirectory() as warm_dir:
+        if not cold:
+            run(script, warm_dir)
+        for _ in range(repeat):
+            if cold:
+                with tempfile.TemporaryDirectory() as cold_dir:
+                    runs.append(run(script, cold_dir))
+            else:
+                runs.append(run(script, warm_dir))
+    return {key: median(r[key] for r in runs) if isinstance(value, float) else value
+            for key, value in runs[0].items()}
+
+
+def main():
+    parser = ArgumentParser(description='Import time of the package and the first frame latency of every bot.')
+    parser.add_argument('bots', nargs='*', default=BOTS)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--waypoints', type=int, default=50, help='waypoints of the synthetic track')
+    args = parser.parse_args()
+    parent = PACKAGE.rsplit('.', 1)[0]
+
+    result = measure(IMPORT_SCRIPT.format(parent=parent, package=PACKAGE), args.repeat, cold=False)
+    print(f'import {PACKAGE}: {1e3 * result["import"]:.1f}ms, '
+          f'numpy {"loaded" if result["numpy"] else "not loaded"}, '
+          f'pygame {"loaded" if result["pygame"] else "not loaded"}')
+
+    print(f'{"bot":<14}{"cache":<6}' + ' '.join(f'{column:>11}' for column in ('import', 'construct', '1st frame',
+                                                                             '2nd frame')))
+    for bot in args.bots:
+        script = BOT_SCRIPT.format(parent=parent, package=PACKAGE, bot=bot, waypoints=args.waypoints)
+        for cold in (True, False):
+            result = measure(script, args.repeat, cold)
+            print(f'{bot:<14}{"cold" if cold else "warm":<6}' + ' '.join(
+                f'{1e3 * result[key]:>9.2f}ms' for key in ('import', 'construct', 'first_frame', 'second_frame')))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import gc
+import json
+import os
+import sys
+import tempfile
+from argparse import ArgumentParser
+from importlib import import_module
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Type
+
+import numpy as np
+from pygame import Vector2
+
+from .tracks import synthetic_track
+from .. import BOTS, cache
+from ..headless import race
+from ..recording import Recording, replay
+from ....bot import Bot
+from ....constants import framerate
+from ....track import Track
+
+BASELINES = Path(__file__).with_name('baselines.json')
+SIZES = [50, 200, 1000, 10000]
+
+# The timings that are checked against the baselines, and the difference in seconds below which a slowdown is noise
+CHECKED = ('init', 'compute')
+NOISE = 100e-6
+
+
+def calibrate(repeat: int = 20) -> float:
+    """Duration of a fixed mix of Vector2 and small NumPy operations, like those of the bots. Timings are compared
+    in units of it, so that the baselines roughly carry over to other machines."""
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        v, a = Vector2(1, 2), np.arange(64.)
+        for i in range(20000):
+            v = (v + Vector2(i, 1)).normalize() * 3
+            if i % 8 == 0:
+                a = np.sqrt(a * a + 1)
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def measure(bot_class: Type[Bot], track: Track, frames: int, repeat: int) -> Dict[str, float]:
+    """Construction and init time of a bot, and its compute_commands times over the inputs of a race that it drove
+    itself, replayed to fresh bots. Every timing is the median of `repeat` runs, and the fastest run is kept as well
+    (`init_min`, `compute_min`)."""
+    inits = []
+    for _ in range(repeat):
+        gc.collect()
+        start = perf_counter()
+        bot = bot_class(track)
+        bot.init()
+        inits.append(perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'race.rec')
+        race(bot, track, laps=sys.maxsize, max_time=frames / framerate, recording=path)
+        recording = Recording(path)
+        runs = []
+        for _ in range(repeat):
+            bot = bot_class(track)
+            bot.init()
+            runs.append(replay(bot, recording).compute_times)
+        del recording
+    means = [times.mean() for times in runs]
+    return {
+        'init': float(np.median(inits)),
+        'init_min': min(inits),
+        'compute': float(np.median(means)),
+        'compute_min': float(min(means)),
+        'p99': float(np.median([np.percentile(times, 99) for times in runs])),
+    }
+
+
+def regressions(results: Dict[str, Dict[str, Dict[str, float]]], baselines: Dict, threshold: float) -> List[str]:
+    """Timings that are more than `threshold` slower than their baseline, after scaling by the calibration.
+
+    The median of the runs is compared to the baseline median, and a timing only counts as a regression when even its
+    fastest run is that much slower: a slowdown within the spread of the runs is noise."""
+    scale = baselines['calibration'] / results['calibration']
+    messages = []
+    for bot, sizes in results['bots'].items():
+        for size, timings in sizes.items():
+            baseline = baselines['bots'].get(bot, {}).get(size)
+            if baseline is None:
+                continue
+            for key in CHECKED:
+                value, fastest = scale * timings[key], scale * timings[f'{key}_min']
+                limit = max((1 + threshold) * baseline[key], baseline[key] + NOISE)
+                if value > limit and fastest > limit:
+                    messages.append(f'{bot} on {size} waypoints: {key} {1e3 * value:.3f}ms, baseline '
+                                    f'{1e3 * baseline[key]:.3f}ms (+{100 * (value / baseline[key] - 1):.0f}%)')
+    return messages
+
+
+def print_scaling(bot: str, sizes: Dict[str, Dict[str, float]]):
+    print(f'{bot}\n{"waypoints":>11}{"init":>12}{"compute":>12}{"p99":>12}{"frames/s":>11}{"scaling":>9}')
+    smallest = next(iter(sizes.values()))['compute']
+    for size, timings in sizes.items():
+        print(f'{size:>11}{1e3 * timings["init"]:>10.3f}ms{1e6 * timings["compute"]:>10.1f}us'
+              f'{1e6 * timings["p99"]:>10.1f}us{1 / timings["compute"]:>11.0f}{timings["compute"] / smallest:>9.2f}')
+
+
+def main():
+    parser = ArgumentParser(description='Time the construction and compute_commands of the bots on synthetic tracks of '
+                                        'growing size, and fail if a bot got slower than its baseline.')
+    parser.add_argument('bots', nargs='*', default=list(BOTS))
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='waypoint counts of the tracks')
+    parser.add_argument('--frames', type=int, default=600, help='frames driven on every track')
+    parser.add_argument('--curvature', type=float, default=0.5)
+    parser.add_argument('--width', type=float, default=50.)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=15, help='runs of every measurement, the median counts')
+    parser.add_argument('--threshold', type=float, default=0.5, help='allowed slowdown, as a fraction')
+    parser.add_argument('--baselines', default=BASELINES, type=Path)
+    parser.add_argument('--update', action='store_true', help='store the results as the new baselines')
+    args = parser.parse_args()
+
+    # the preprocessing is part of what is measured
+    cache.CACHE_DIR = ''
+    bots = import_module('..', __package__)
+    settings = {'frames': args.frames, 'curvature': args.curvature, 'width': args.width, 'seed': args.seed}
+    results = {'calibration': calibrate(), 'settings': settings, 'bots': {}}
+    for name in args.bots:
+        sizes = results['bots'][name] = {}
+        for size in args.sizes:
+            track = synthetic_track(size, args.seed, args.curvature, args.width)
+            sizes[str(size)] = measure(getattr(bots, name), track, args.frames, args.repeat)
+        print_scaling(name, sizes)
+    # the speed of a shared machine drifts, the best of the calibrations before and after is closest to the timings
+    results['calibration'] = min(results['calibration'], calibrate())
+
+    if args.update:
+        baselines = json.loads(args.baselines.read_text()) if args.baselines.exists() else None
+        if baselines and baselines['settings'] == settings:
+            # keep the baselines of the bots and sizes that were not run
+            for name, sizes in baselines['bots'].items():
+                for size, timings in sizes.items():
+                    timings = {key: value * results['calibration'] / baselines['calibration']
+                               for key, value in timings.items()}
+                    results['bots'].setdefault(name, {}).setdefault(size, timings)
+        args.baselines.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+        print(f'Stored the baselines in {args.baselines}')
+        return
+
+    if not args.baselines.exists():
+        print(f'There are no baselines in {args.baselines}, store them with --update')
+        return
+    baselines = json.loads(args.baselines.read_text())
+    if baselines['settings'] != settings:
+        sys.exit(f'The baselines were measured with {baselines["settings"]}')
+    messages = regressions(results, baselines, args.threshold)
+    for message in messages:
+        print(message)
+    if messages:
+        sys.exit(f'{len(messages)} timings regressed by more than {100 * args.threshold:.0f}%')
+    print('No regressions')
+
+
+if __name__ == '__main__':
+    main()
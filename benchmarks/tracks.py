@@ -0,0 +1,36 @@
+from math import pi
+from typing import List
+
+import numpy as np
+from pygame import Vector2
+
+
+class SyntheticTrack:
+    """The parts of a game track that the bots use: the waypoints and the track width."""
+
+    def __init__(self, lines: List[Vector2], track_width: float):
+        self.lines = lines
+        self.track_width = track_width
+
+
+def synthetic_track(n_waypoints: int = 50, seed: int = 0, curvature: float = 0.5, track_width: float = 50.,
+                    spacing: float = 150., waves: int = 4) -> SyntheticTrack:
+    """A closed loop of waypoints about `spacing` apart, whose radius oscillates with a few random waves.
+
+    Every wave is 15 to 60 waypoints long, so a longer track has more corners rather than wider ones. `curvature`
+    sets how tight the corners are: at 1 the tightest ones have a radius of about 2 * spacing. The radius of the loop
+    stays positive, so it never crosses itself. The same arguments always give the same track.
+    """
+    rng = np.random.default_rng(seed)
+    radius = spacing * n_waypoints / (2 * pi)
+    harmonics = np.maximum(2, np.round(n_waypoints / rng.uniform(15, 60, waves)))
+    wavelengths = 2 * pi * radius / harmonics
+    # a sine of amplitude a and wavelength l bends with a radius of l ** 2 / (4 pi ** 2 a) at its extremes
+    amplitudes = curvature * wavelengths ** 2 / (4 * pi ** 2 * 2 * spacing * waves)
+    amplitudes *= min(1., 0.5 * radius / amplitudes.sum())
+    phases = rng.uniform(0, 2 * pi, waves)
+
+    a = 2 * pi * np.arange(n_waypoints) / n_waypoints
+    r = radius + np.sin(np.outer(a, harmonics) + phases) @ amplitudes
+    x, y = 2 * radius + r * np.cos(a), 2 * radius + r * np.sin(a)
+    return SyntheticTrack([Vector2(float(px), float(py)) for px, py in zip(x, y)], track_width)
@@ -0,0 +1,99 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from ...track import Track
+
+# Bump this when the meaning of a cached array changes
+CACHE_VERSION = 3
+
+# Set RACER_CACHE_DIR to an empty string to disable the cache
+CACHE_DIR = os.environ.get('RACER_CACHE_DIR', str(Path.home() / '.cache' / 'racer'))
+
+# Entries that were not used for this many seconds are evicted, and then the least recently used ones until the
+# cache is at most this many bytes
+CACHE_MAX_AGE = 30 * 24 * 3600
+CACHE_MAX_SIZE = 256 * 2 ** 20
+
+
+def track_id(track: Track) -> str:
+    """Hash of the track geometry alone. It does not change with CACHE_VERSION, so recordings and tuner results can
+    use it to identify their track."""
+    h = hashlib.sha1()
+    h.update(np.array([(p.x, p.y) for p in track.lines], dtype=float).tobytes())
+    h.update(repr(track.track_width).encode('utf-8'))
+    return h.hexdigest()
+
+
+def track_hash(track: Track, **config) -> str:
+    """Hash the track geometry together with the cache version and the config values that the derived data depends
+    on."""
+    h = hashlib.sha1()
+    h.update(repr((track_id(track), CACHE_VERSION, sorted(config.items()))).encode('utf-8'))
+    return h.hexdigest()
+
+
+def cached(name: str, track: Track, build: Callable[[], Dict[str, np.ndarray]], **config) -> Dict[str, np.ndarray]:
+    """Return the arrays that `build` derives from the track, computing them only if they are not on disk yet.
+
+    Every array is stored as a separate .npy file in a directory per (name, track, config) and is loaded memory
+    mapped and read-only. Storing a new directory evicts old ones, see `evict`. If the cache directory can not be
+    written, the arrays are just computed.
+    """
+    if not CACHE_DIR:
+        return build()
+
+    path = Path(CACHE_DIR) / f'{name}-{track_hash(track, **config)}'
+    if path.is_dir():
+        try:
+            arrays = {f.stem: np.load(f, mmap_mode='r') for f in path.glob('*.npy')}
+            # the modification time of a directory is when it was last used
+            os.utime(path)
+            return arrays
+        except (OSError, ValueError):
+            pass
+
+    arrays = build()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=path.parent, prefix=f'.{path.name}-')
+        for key, value in arrays.items():
+            np.save(os.path.join(tmp, f'{key}.npy'), np.asarray(value))
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            # another process stored the same arrays in the meantime
+            shutil.rmtree(tmp, ignore_errors=True)
+        evict(path.parent)
+    except OSError:
+        pass
+    return arrays
+
+
+def evict(directory: Path, max_age: Optional[float] = None, max_size: Optional[int] = None):
+    """Remove the cache entries that were not used for max_age seconds, then the least recently used ones until all
+    entries take at most max_size bytes. The defaults are CACHE_MAX_AGE and CACHE_MAX_SIZE."""
+    max_age = CACHE_MAX_AGE if max_age is None else max_age
+    max_size = CACHE_MAX_SIZE if max_size is None else max_size
+    entries = []
+    for entry in directory.iterdir():
+        # directories starting with a dot are still being written
+        if entry.is_dir() and not entry.name.startswith('.'):
+            try:
+                entries.append((entry.stat().st_mtime, sum(f.stat().st_size for f in entry.iterdir()), entry))
+            except OSError:
+                pass
+
+    now = time.time()
+    total = sum(size for _, size, _ in entries)
+    for used, size, entry in sorted(entries, key=lambda e: e[0]):
+        if now - used <= max_age and total <= max_size:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
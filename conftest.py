@@ -0,0 +1,12 @@
+import pytest
+
+from . import cache
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path_factory, monkeypatch):
+    """Keep the cache of the tests out of the home directory, in one directory for the whole session."""
+    directory = str(tmp_path_factory.getbasetemp() / 'cache')
+    monkeypatch.setattr(cache, 'CACHE_DIR', directory)
+    monkeypatch.setenv('RACER_CACHE_DIR', directory)
+    return directory
@@ -1,22 +1,24 @@
-import json
 from argparse import Namespace
-from copy import deepcopy
+from functools import cached_property
 from math import sqrt
-from socket import socket, AF_INET, SOCK_DGRAM
-from typing import Tuple
+from time import perf_counter
+from typing import Optional, Tuple
 
 import numpy as np
 import pygame
 from pygame import Vector2, Color, Surface
 
-from .utils import calculate_target_speeds
+from .geometry import TrackGeometry
+from .background import BackgroundPlanner
+from .instrumentation import instrumentation
+from .overlay import Overlay
+from .policy_table import PolicyTable
+from .rollout import Rollout
+from .telemetry import telemetry
+from .utils import needs_init
 from ...bot import Bot
-from ...car_info import CarPhysics
 from ...constants import framerate
 from ...linear_math import Transform
-from ...track import Track
-
-DEBUG = False
 
 
 class Dustrider(Bot):
@@ -29,13 +31,69 @@ class Dustrider(Bot):
             w_waypoint=8797.335306281711,
             w_speed=3.496329938262048,
             n=25,
+            n_throttle=3,
+            n_steering=5,
+
+            # 'grid' searches constant commands, 'sampling' refines the previous plan, 'anytime' refines the grid
+            # until the budget (a fraction of a frame) is used up and 'tree' changes the command at tree_depth points
+            # within the horizon.
+            # 'table' looks the grid search result up in a PolicyTable and searches the grid where the table does not
+            # cover the state. A lookup costs about a fifth of a grid search, but on the synthetic benchmark tracks only
+            # 47-89% of frames are covered, and the coarse states drive slower laps on 4 of 5 tracks (see
+            # benchmarks/policy.py). init builds the table if it is not cached, which takes about a minute per 50
+            # waypoints; build it ahead with PolicyTable.of
+            planner='grid',
+            budget=0.5,
+            chunk=16,
+            samples=8,
+            elites=2,
+            iterations=2,
+            sigma_throttle=0.5,
+            sigma_steering=0.5,
+            min_sigma=0.05,
+            tree_depth=2,
+            tree_beam=6,
+            tree_position_quantum=8.,
+            tree_heading_quantum=0.1,
+            tree_velocity_quantum=8.,
+            table_interpolate=False,
+
+            # plan in a background process and drive the freshest plan, shifted to the current tick; pursue the next
+            # waypoint while there is no plan that reaches the current tick
+            asynchronous=False,
         )
-        self.target_speeds = calculate_target_speeds(track, self.config.corner_slow_down)
-        self.simulation = []
-        self.font = pygame.font.SysFont('', 20)
-        if DEBUG:
-            self.sock = socket(AF_INET, SOCK_DGRAM)
-            self.server_address = ('127.0.0.1', 12389)
+        self.simulation = np.empty((0, 2))
+        self.previous_command = (0., 0.)
+        self.candidates_evaluated = 0
+        self._anytime_grid = None
+        self.rng = np.random.default_rng()
+        self.background = None
+        self.initialized = False
+        self.channel = telemetry.channel(self.name, ('target_speed', 'speed', 'throttle', 'steering_command',
+                                                     'candidates', 'staleness'))
+
+    def init(self):
+        self.geometry = TrackGeometry.of(self.track)
+        self.target_speeds = self.geometry.target_speeds(self.config.corner_slow_down)
+        self.rollouts = {}
+        self.plan = np.zeros((2, self.config.n))
+        self.overlay = Overlay(self.draw_overlay)
+        self.policy_table = None
+        if self.config.planner == 'table':
+            self.policy_table = PolicyTable.of(self, self.config.table_interpolate)
+        if self.background:
+            self.background.close()
+        self.background = BackgroundPlanner(self) if self.config.asynchronous else None
+        if self.background:
+            # start the worker before the race, not in the first frame
+            self.background.start()
+        self.tick = 0
+        self.staleness = 0
+        self.initialized = True
+
+    @cached_property
+    def font(self):
+        return pygame.font.SysFont('', 20)
 
     @property
     def name(self):
@@ -49,87 +107,279 @@ class Dustrider(Bot):
     def color(self):
         return Color(200, 200, 0)
 
+    @instrumentation.timed('compute_commands')
+    @needs_init
     def compute_commands(self, next_waypoint: int, position: Transform, velocity: Vector2) -> Tuple:
-        dt = 1 / framerate
+        if self.background:
+            return self.background_commands(next_waypoint, position, velocity)
 
-        # print()
-        best_cost = float('inf')
-        best_throttle = 0
-        best_steering_command = 0
-        for throttle in np.linspace(-1, 1, 3):
-            for steering_command in np.linspace(-1, 1, 5):
-                waypoint, end_position, end_velocity = self.simulate(next_waypoint, position, velocity, throttle,
-                                                                     steering_command, dt, self.config.n)
-                waypoint_plus_one = (waypoint + 1) % len(self.track.lines)
-
-                # cost 2
-                distance_to_next_waypoint = (self.track.lines[waypoint] - end_position.p).length()
-
-                # cost 3
-                target_speed_at_waypoint = self.target_speeds[waypoint_plus_one]
-                target_speed = sqrt(
-                    target_speed_at_waypoint ** 2 + 2 * self.config.deceleration * distance_to_next_waypoint)
-                velocity_diff = max(0., end_velocity.length() - target_speed) * self.config.w_speed
-
-                # total cost
-                cost = -self.config.w_waypoint * ((waypoint - next_waypoint) % len(
-                    self.track.lines)) + distance_to_next_waypoint + velocity_diff
-                if cost < best_cost:
-                    # print(f'Better\tcost={cost:.3f} throttle={throttle} steering={steering_command} waypoint={waypoint} distance={distance_to_next_waypoint:.3f} speed={end_velocity.length():.3f} target_speed={target_speed:.3f} velocity_diff={velocity_diff:.3f}')
-                    best_cost = cost
-                    best_throttle = throttle
-                    best_steering_command = steering_command
-                # else:
-                # print(f'\tcost={cost:.3f} throttle={throttle} steering={steering_command} waypoint={waypoint} distance={distance_to_next_waypoint:.3f} speed={end_velocity.length():.3f} target_speed={target_speed:.3f} velocity_diff={velocity_diff:.3f}')
-
-        if DEBUG:
-            data = {
-                'target_speed': target_speed,
-            }
-            self.sock.sendto(json.dumps(data).encode('utf-8'), self.server_address)
-
-        # Simulate the best throttle and steering command
-        car = CarSimulator(self.track, next_waypoint, deepcopy(position), deepcopy(velocity))
-        self.simulation = []
-        self.simulation.append(deepcopy(car.car_physics.position))
-        for i in range(self.config.n):
-            car.update(dt, best_throttle, best_steering_command)
-            self.simulation.append(deepcopy(car.car_physics.position))
+        commands, trajectory, target_speed = self.search(next_waypoint, position, velocity)
+        best_throttle, best_steering_command = commands[:, 0]
+
+        if telemetry.enabled:
+            self.channel.record(target_speed, velocity.length(), best_throttle, best_steering_command,
+                                self.candidates_evaluated, 0)
+
+        # Keep the trajectory of the best candidate for drawing
+        self.simulation = trajectory
 
         # Print simulation
         # print(f'Position: {position.p}')
         # print('\n')
         return best_throttle, best_steering_command
 
-    def simulate(self, next_waypoint: int, position: Transform, velocity: Vector2, throttle, steering_command, dt, N):
-        car = CarSimulator(self.track, next_waypoint, deepcopy(position), deepcopy(velocity))
-        for i in range(N):
-            car.update(dt, throttle, steering_command)
-        return car.next_waypoint, car.car_physics.position, car.car_physics.velocity
+    def background_commands(self, next_waypoint: int, position: Transform, velocity: Vector2) -> Tuple:
+        """Hand the state to the background planner and drive its freshest plan, shifted by its age. The game loop
+        never searches itself: before the first plan and when the plan has run out, the car pursues the next
+        waypoint."""
+        self.tick += 1
+        self.background.observe(self.tick, next_waypoint, position, velocity)
+        plan = self.background.latest()
+        if plan is not None:
+            # the number of ticks since the state the plan started from
+            self.staleness = self.tick - plan.tick
+            if instrumentation.enabled:
+                instrumentation.count(self.name, 'staleness', self.staleness)
+        if plan is None or self.staleness >= len(plan.trajectory) - 1:
+            throttle, steering_command, target_speed = self.pursuit_commands(next_waypoint, position, velocity)
+            if telemetry.enabled:
+                self.channel.record(target_speed, velocity.length(), throttle, steering_command, 0, self.staleness)
+            return throttle, steering_command
+
+        throttle, steering_command = plan.at(self.tick)
+        self.simulation = plan.trajectory[self.staleness:]
+        if telemetry.enabled:
+            self.channel.record(plan.target_speed, velocity.length(), throttle, steering_command, 0, self.staleness)
+        return throttle, steering_command
+
+    def pursuit_commands(self, next_waypoint: int, position: Transform, velocity: Vector2) -> Tuple:
+        """The commands of PurePursuit towards the next waypoint, braking for its target speed, and that speed."""
+        target = self.geometry.points[next_waypoint]
+        target_speed = sqrt(self.target_speeds[next_waypoint] ** 2 +
+                            2 * self.config.deceleration * (Vector2(*target) - position.p).length())
+        target = position.inverse() * Vector2(*target)
+        try:
+            gamma = 2 * target.y / target.length_squared()
+        except ZeroDivisionError:
+            gamma = 0
+        throttle = -1 if target_speed < velocity.length() else 1
+        return throttle, gamma * velocity.length(), target_speed
+
+    def search(self, next_waypoint: int, position: Transform, velocity: Vector2) -> Tuple:
+        """Search from a state with the configured planner: the commands (2, m) to drive from it, tick by tick, and
+        the trajectory and target speed of the best candidate. The last command holds when the commands run out."""
+        dt = 1 / framerate
+
+        with instrumentation.phase(self, 'search'):
+            if self.config.planner == 'sampling':
+                search = self.search_sampling
+            elif self.config.planner == 'anytime':
+                search = self.search_anytime
+            elif self.config.planner == 'tree':
+                search = self.search_tree
+            elif self.config.planner == 'table':
+                search = self.search_table
+            else:
+                search = self.search_grid
+            commands, trajectory, target_speed = search(next_waypoint, position, velocity, dt)
+        self.previous_command = tuple(commands[:, 0])
+        return commands, trajectory, target_speed
+
+    def grid_commands(self):
+        """Every combination of n_throttle throttle and n_steering steering commands."""
+        throttle, steering_command = np.meshgrid(np.linspace(-1, 1, self.config.n_throttle),
+                                                 np.linspace(-1, 1, self.config.n_steering), indexing='ij')
+        return throttle.ravel(), steering_command.ravel()
+
+    # Every search returns the chosen commands as in `search`, the trajectory of the best candidate and its target
+    # speed
+
+    def search_grid(self, next_waypoint: int, position: Transform, velocity: Vector2, dt: float):
+        """Try every combination of constant throttle and steering commands."""
+        throttle, steering_command = self.grid_commands()
+
+        rollout = self.get_rollout(len(throttle))
+        rollout.simulate(next_waypoint, position, velocity, throttle, steering_command, dt)
+        best = np.argmin(rollout.cost(next_waypoint, self.config))
+        self.candidates_evaluated = len(throttle)
+        return (np.array([[throttle[best]], [steering_command[best]]]), rollout.trajectory[:, best],
+                rollout.target_speed[best])
+
+    def search_table(self, next_waypoint: int, position: Transform, velocity: Vector2, dt: float):
+        """Look the grid search result up in the policy table, and search the grid where the table does not cover the
+        state."""
+        commands = self.policy_table.lookup(next_waypoint, position, velocity)
+        if commands is None:
+            return self.search_grid(next_waypoint, position, velocity, dt)
+        self.candidates_evaluated = 0
+        return np.array(commands).reshape(2, 1), np.empty((0, 2)), float('nan')
+
+    def search_anytime(self, next_waypoint: int, position: Transform, velocity: Vector2, dt: float):
+        """Search ever finer grids of constant commands until the time budget runs out.
+
+        The candidates are the previous command followed by the points of a 3x5, 5x9, 9x17 and 17x33 grid that were
+        not tried on a coarser grid. They are evaluated in chunks of equal size, and a chunk is only started when,
+        judging by the slowest chunk so far, it can finish before the deadline. The first chunk always runs.
+        """
+        deadline = perf_counter() + self.config.budget / framerate
+        candidates = np.concatenate([[self.previous_command], self.anytime_grid()])
+
+        best_cost = float('inf')
+        chunk_duration = 0.
+        self.candidates_evaluated = 0
+        for start in range(0, len(candidates), self.config.chunk):
+            chunk_start = perf_counter()
+            if start and chunk_start + chunk_duration > deadline:
+                break
+
+            throttle, steering_command = candidates[start:start + self.config.chunk].T
+            rollout = self.get_rollout(len(throttle))
+            rollout.simulate(next_waypoint, position, velocity, throttle, steering_command, dt)
+            cost = rollout.cost(next_waypoint, self.config)
+            self.candidates_evaluated += len(throttle)
+            chunk_duration = max(chunk_duration, perf_counter() - chunk_start)
+
+            i = np.argmin(cost)
+            if cost[i] < best_cost:
+                best_cost = cost[i]
+                # the rollout is reused by later chunks of the same size
+                best = (np.array([[throttle[i]], [steering_command[i]]]), rollout.trajectory[:, i].copy(),
+                        rollout.target_speed[i])
+        return best
+
+    def anytime_grid(self) -> np.ndarray:
+        if self._anytime_grid is None:
+            levels = []
+            for n_throttle, n_steering in ((3, 5), (5, 9), (9, 17), (17, 33)):
+                throttle, steering_command = np.meshgrid(np.linspace(-1, 1, n_throttle),
+                                                         np.linspace(-1, 1, n_steering), indexing='ij')
+                levels.append(np.column_stack([throttle.ravel(), steering_command.ravel()]))
+            grid = np.concatenate(levels)
+            _, first = np.unique(grid, axis=0, return_index=True)
+            self._anytime_grid = grid[np.sort(first)]
+        return self._anytime_grid
+
+    def search_sampling(self, next_waypoint: int, position: Transform, velocity: Vector2, dt: float):
+        """Refine the plan of the previous frame by sampling time-varying command sequences around it.
+
+        The plan is shifted by one tick and refined cross-entropy style: sample sequences around the plan, keep the
+        `elites` cheapest ones and fit the plan and its spread to them. The first sample is always the unperturbed plan.
+        """
+        if self.plan.shape != (2, self.config.n):
+            self.plan = np.zeros((2, self.config.n))
+        self.plan[:, :-1] = self.plan[:, 1:]
+
+        rollout = self.get_rollout(self.config.samples)
+        sigma = np.empty((2, self.config.n))
+        sigma[0] = self.config.sigma_throttle
+        sigma[1] = self.config.sigma_steering
+        for _ in range(self.config.iterations):
+            noise = self.rng.normal(size=(2, self.config.samples, self.config.n)) * sigma[:, np.newaxis]
+            noise[:, 0] = 0
+            commands = np.clip(self.plan[:, np.newaxis] + noise, -1, 1)
+
+            rollout.simulate(next_waypoint, position, velocity, commands[0], commands[1], dt)
+            cost = rollout.cost(next_waypoint, self.config)
+            elites = commands[:, np.argsort(cost)[:self.config.elites]]
+            self.plan = elites.mean(axis=1)
+            sigma = np.maximum(elites.std(axis=1), self.config.min_sigma)
+
+        best = np.argmin(cost)
+        self.candidates_evaluated = self.config.iterations * self.config.samples
+        return commands[:, best], rollout.trajectory[:, best], rollout.target_speed[best]
+
+    def search_tree(self, next_waypoint: int, position: Transform, velocity: Vector2, dt: float):
+        """Search command sequences that switch to another grid command at tree_depth points within the horizon.
+
+        The tree is expanded level by level. Every node of a level tries all grid commands from the state its parent
+        reached at the switch point, and holds them until the end of the horizon, so every node is scored like a grid
+        candidate over the whole horizon. The first level is the grid search itself, which the tree can only improve
+        on. The states at the next switch point that match after quantizing their position, heading, velocity and
+        next waypoint are transpositions: only the cheapest one is kept. Then only the tree_beam cheapest are expanded
+        further.
+        """
+        throttle, steering_command = self.grid_commands()
+        n_commands = len(throttle)
+        starts = np.unique(np.linspace(0, self.config.n, self.config.tree_depth + 1).astype(int)[:-1])
+        ends = np.append(starts[1:], self.config.n)
+        quantum = np.array([self.config.tree_position_quantum] * 2 + [self.config.tree_heading_quantum] * 2 +
+                           [self.config.tree_velocity_quantum] * 2)
 
+        self.candidates_evaluated = 0
+        self.transpositions = 0
+        levels = []
+        best_cost, best = float('inf'), None
+        parents = np.zeros(n_commands, dtype=int)
+        for level, (start, end) in enumerate(zip(starts, ends)):
+            size = n_commands if level == 0 else self.config.tree_beam * n_commands
+            rows = len(parents)
+            commands = np.resize(throttle, size), np.resize(steering_command, size)
+
+            # simulate until the next switch point, then hold the commands until the horizon
+            head = self.get_rollout(size, end - start)
+            if level == 0:
+                head.reset(next_waypoint, position, velocity)
+            else:
+                # unused rows repeat the first ones
+                head.reset_states(*(a[np.resize(parents, size)] for a in state))
+            head.advance(dt, *commands)
+            self.candidates_evaluated += rows
+            state = tuple(a[:rows].copy() for a in (head.next_waypoint, head.p, head.heading, head.v))
+            levels.append((parents, head.trajectory[:, :rows].copy()))
+            scored = head
+            if end < self.config.n:
+                scored = self.get_rollout(size, self.config.n - end)
+                scored.reset_states(*(np.resize(a, (size,) + a.shape[1:]) for a in state))
+                scored.advance(dt, *commands)
+
+            cost = scored.cost(next_waypoint, self.config)[:rows]
+            i = np.argmin(cost)
+            if cost[i] < best_cost:
+                best_cost = cost[i]
+                best = level, i, scored.trajectory[1:, i].copy() if end < self.config.n else None, \
+                    scored.target_speed[i]
+            if end == self.config.n:
+                break
+
+            keys = np.column_stack([np.floor(np.column_stack(state[1:]) / quantum), state[0]])
+            order = np.argsort(cost, kind='stable')
+            _, first = np.unique(keys[order], axis=0, return_index=True)
+            self.transpositions += rows - len(first)
+            survivors = order[np.sort(first)][:self.config.tree_beam]
+            parents = np.repeat(survivors, n_commands)
+
+        # follow the best node back to the root; every row of a level was expanded from the row `parents` of the
+        # level before
+        level, row, tail, target_speed = best
+        chosen = [row % n_commands] * (self.config.n - starts[level])
+        segments = [levels[level][1][1:, row]] + ([] if tail is None else [tail])
+        for previous in range(level - 1, -1, -1):
+            row = levels[previous + 1][0][row]
+            chosen = [row % n_commands] * (ends[previous] - starts[previous]) + chosen
+            segments.insert(0, levels[previous][1][1:, row])
+        trajectory = np.concatenate([levels[0][1][:1, 0]] + segments)
+        return np.array([throttle[chosen], steering_command[chosen]]), trajectory, target_speed
+
+    def get_rollout(self, size: int, n: Optional[int] = None) -> Rollout:
+        """Return a rollout for `size` candidates and n steps (config.n by default), reusing an earlier one of the
+        same shape."""
+        key = size, n or self.config.n
+        if key not in self.rollouts:
+            self.rollouts[key] = Rollout(self.geometry, self.target_speeds, *key)
+        return self.rollouts[key]
+
+    @instrumentation.timed('draw')
+    @needs_init
     def draw(self, map_scaled: Surface, zoom):
         # Draw the simulation on the scaled map
-        # print(f'Simulation: {[p.p for p in self.simulation]}')
-        if self.simulation:
-            pygame.draw.lines(map_scaled, (0, 0, 0), False, [zoom * p.p for p in self.simulation], 2)
+        # print(f'Simulation: {self.simulation}')
+        if len(self.simulation) > 1:
+            pygame.draw.lines(map_scaled, (0, 0, 0), False, zoom * self.simulation, 2)
 
+        self.overlay.draw(map_scaled, zoom)
+
+    def draw_overlay(self, surface: Surface, zoom):
         # Draw the target speeds
         for i, target_speed in enumerate(self.target_speeds):
             text = self.font.render(f'{target_speed:.2f}', True, (0, 0, 0))
-            map_scaled.blit(text, (self.track.lines[i].x * zoom, self.track.lines[i].y * zoom))
-
-
-class CarSimulator:
-    def __init__(self, track: Track, next_waypoint: int, position: Transform, velocity: Vector2):
-        self.track = track
-        self.next_waypoint = next_waypoint
-        self.car_physics = CarPhysics(position, velocity)
-
-    def update(self, dt: float, throttle: float, steering_command: float):
-        self.car_physics.update(dt, throttle, steering_command)
-
-        # Update next waypoint
-        if (self.track.lines[self.next_waypoint] - self.car_physics.position.p).length() < self.track.track_width:
-            self.next_waypoint = self.next_waypoint + 1
-            if self.next_waypoint >= len(self.track.lines):
-                self.next_waypoint = 0
+            surface.blit(text, (self.track.lines[i].x * zoom, self.track.lines[i].y * zoom))
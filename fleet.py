@@ -0,0 +1,174 @@
+from abc import ABC, abstractmethod
+from math import pi
+from typing import Dict, Sequence, Tuple, Type
+
+import numpy as np
+from pygame import Vector2
+
+from .pid import PID
+from .pure_pursuit import PurePursuit
+from .spline_bot import RoadSprinter
+from ...bot import Bot
+from ...linear_math import Transform
+
+
+def stack_inputs(inputs: Sequence[Tuple[int, Transform, Vector2]]) -> Tuple[np.ndarray, ...]:
+    """Arrays of next waypoints (n,), rotation columns (n, 2, 2), positions (n, 2) and velocities (n, 2) from the
+    compute_commands arguments of n cars."""
+    next_waypoint = np.array([i for i, _, _ in inputs], dtype=np.intp)
+    rotation = np.array([[tuple(position.M.cols[0]), tuple(position.M.cols[1])] for _, position, _ in inputs])
+    position = np.array([tuple(position.p) for _, position, _ in inputs])
+    velocity = np.array([tuple(velocity) for _, _, velocity in inputs])
+    return next_waypoint, rotation, position, velocity
+
+
+def to_car_frame(rotation: np.ndarray, position: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """position.inverse() * point for every car, with the operations in the same order as Transform."""
+    c0, c1 = rotation[:, 0], rotation[:, 1]
+    x = (c0[:, 0] * points[:, 0] + c0[:, 1] * points[:, 1]) + -(c0[:, 0] * position[:, 0] + c0[:, 1] * position[:, 1])
+    y = (c1[:, 0] * points[:, 0] + c1[:, 1] * points[:, 1]) + -(c1[:, 0] * position[:, 0] + c1[:, 1] * position[:, 1])
+    return np.column_stack([x, y])
+
+
+def polar_angle(v: np.ndarray) -> np.ndarray:
+    """Vector2.as_polar()[1] of every row, in degrees."""
+    return np.arctan2(v[:, 1], v[:, 0]) * 180. / pi
+
+
+def norm(v: np.ndarray) -> np.ndarray:
+    """Vector2.length of every row."""
+    return np.sqrt(v[:, 0] * v[:, 0] + v[:, 1] * v[:, 1])
+
+
+def pursuit(target: np.ndarray, speed: np.ndarray) -> np.ndarray:
+    """Angular velocity to drive a circle through a target in the car frame, 0 for a target at the car."""
+    length_squared = target[:, 0] * target[:, 0] + target[:, 1] * target[:, 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gamma = np.where(length_squared == 0, 0., 2 * target[:, 1] / length_squared)
+    return gamma * speed
+
+
+class Fleet(ABC):
+    """Drives many bots of the same class on one track with one NumPy evaluation per frame.
+
+    Every subclass is a transcription of the compute_commands of its bot class for arrays of cars, and has to be kept
+    in sync with it: for the same inputs it returns the same commands. The cars keep the configs their bots had when
+    the fleet was created, and may differ in every field that the shared track data does not depend on. State that a
+    bot keeps between frames is kept per car by the fleet, starting from the state of the bots.
+    """
+    bot_class: Type[Bot]
+
+    def __init__(self, bots: Sequence[Bot]):
+        if not bots:
+            raise ValueError('A fleet needs at least one bot')
+        if any(type(bot) is not self.bot_class for bot in bots):
+            raise ValueError(f'{type(self).__name__} only drives {self.bot_class.__name__} bots')
+        if any(bot.track is not bots[0].track for bot in bots):
+            raise ValueError('All bots of a fleet have to drive on the same track')
+        for bot in bots:
+            if not bot.initialized:
+                bot.init()
+        self.bots = list(bots)
+        self.cars = np.arange(len(bots))
+        self.points = bots[0].geometry.points
+        self.squared_speeds = np.array([bot.speed_profile.squared for bot in bots])
+        self.deceleration = self.config('deceleration')
+
+    def __len__(self):
+        return len(self.bots)
+
+    def config(self, name: str) -> np.ndarray:
+        return np.array([getattr(bot.config, name) for bot in self.bots], dtype=float)
+
+    def target_speeds(self, next_waypoint: np.ndarray, position: np.ndarray) -> np.ndarray:
+        """SpeedProfile.__call__ of every car."""
+        x, y = self.points[next_waypoint, 0], self.points[next_waypoint, 1]
+        distance = np.sqrt((x - position[:, 0]) ** 2 + (y - position[:, 1]) ** 2)
+        return np.sqrt(self.squared_speeds[self.cars, next_waypoint] + 2 * self.deceleration * distance)
+
+    @abstractmethod
+    def compute_commands(self, next_waypoint: np.ndarray, rotation: np.ndarray, position: np.ndarray,
+                         velocity: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Throttle and steering commands of every car, from the arrays of stack_inputs."""
+
+
+class PIDFleet(Fleet):
+    """NumPy's arctan2 can be a bit off from the C library's, so the steering can differ by about 1e-14."""
+    bot_class = PID
+
+    def __init__(self, bots: Sequence[PID]):
+        super().__init__(bots)
+        self.p = self.config('p')
+        self.d = self.config('d')
+        self.previous_error = np.array([bot.previous_error for bot in bots], dtype=float)
+
+    def compute_commands(self, next_waypoint, rotation, position, velocity):
+        reference = polar_angle(self.points[next_waypoint] - position) * (pi / 180.)
+        measured = polar_angle(velocity) * (pi / 180.)
+        error = np.fmod(reference - measured + pi, 2.0 * pi)
+        error = np.where(error <= 0.0, error + pi, error - pi)
+
+        throttle = np.where(self.target_speeds(next_waypoint, position) < norm(velocity), -1, 1)
+        steering_command = self.p * error + self.d * (error - self.previous_error)
+        self.previous_error = error
+        return throttle, steering_command
+
+
+class PurePursuitFleet(Fleet):
+    bot_class = PurePursuit
+
+    def compute_commands(self, next_waypoint, rotation, position, velocity):
+        target = to_car_frame(rotation, position, self.points[next_waypoint])
+        speed = norm(velocity)
+        throttle = np.where(self.target_speeds(next_waypoint, position) < speed, -1, 1)
+        return throttle, pursuit(target, speed)
+
+
+class RoadSprinterFleet(Fleet):
+    """The closest spline point is found by brute force over the points of the current segment, which are few. Cars
+    that are far off it are looked up one by one in the point index, like the bots do."""
+    bot_class = RoadSprinter
+
+    def __init__(self, bots: Sequence[RoadSprinter]):
+        super().__init__(bots)
+        if any((bot.config.alpha, bot.config.min_segment_length) !=
+               (bots[0].config.alpha, bots[0].config.min_segment_length) for bot in bots):
+            raise ValueError('All bots of a RoadSprinterFleet need the same alpha and min_segment_length')
+        self.path = bots[0].path
+        self.point_index = bots[0].point_index
+        self.max_distance = bots[0].track.track_width
+        self.spline_points = bots[0].point_index.points
+        self.segment_starts = np.asarray(bots[0].segment_starts)
+        self.lookahead = self.config('lookahead')
+        self.lookahead_time = self.config('lookahead_time')
+        self.offsets = np.arange(np.diff(self.segment_starts).max())
+
+    def compute_commands(self, next_waypoint, rotation, position, velocity):
+        segment = (next_waypoint - 1) % (len(self.segment_starts) - 1)
+        start, end = self.segment_starts[segment], self.segment_starts[segment + 1]
+        candidates = np.minimum(start[:, np.newaxis] + self.offsets, end[:, np.newaxis] - 1)
+        distances = np.hypot(self.spline_points[candidates, 0] - position[:, 0, np.newaxis],
+                             self.spline_points[candidates, 1] - position[:, 1, np.newaxis])
+        nearest = np.argmin(distances, axis=1)
+        closest = candidates[self.cars, nearest]
+        for car in np.flatnonzero(distances[self.cars, nearest] > self.max_distance):
+            closest[car] = self.point_index.nearest_along(Vector2(*position[car]), closest[car], start[car], end[car],
+                                                          self.max_distance)
+
+        speed = norm(velocity)
+        lookahead_point = self.path.points_at(closest, self.lookahead + self.lookahead_time * speed)
+        target = to_car_frame(rotation, position, lookahead_point)
+        throttle = np.where(self.target_speeds(next_waypoint, position) < speed, -1, 1)
+        return throttle, pursuit(target, speed)
+
+
+FLEETS: Dict[Type[Bot], Type[Fleet]] = {fleet.bot_class: fleet for fleet in (PIDFleet, PurePursuitFleet,
+                                                                              RoadSprinterFleet)}
+
+
+def fleet_of(bots: Sequence[Bot]) -> Fleet:
+    """The fleet that drives these bots, which all have to be of the same class."""
+    try:
+        return FLEETS[type(bots[0])](bots)
+    except KeyError:
+        raise ValueError(f'There is no fleet for {type(bots[0]).__name__}') from None
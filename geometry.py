@@ -0,0 +1,96 @@
+from typing import Dict
+from weakref import WeakValueDictionary
+
+import numpy as np
+
+from .cache import cached, track_id
+from ...track import Track
+
+
+class TrackGeometry:
+    """Read-only arrays derived from the waypoints of a track.
+
+    Use `TrackGeometry.of(track)` instead of the constructor: it builds the geometry once per track and hands the same
+    instance to every bot in the process. All arrays are indexed by waypoint:
+
+    - points: the waypoints, shape (n, 2)
+    - segment_lengths: distance from waypoint i - 1 to waypoint i
+    - radii: radius of the circle through waypoints i - 1, i and i + 1, inf on a straight line
+    - tangents, normals: unit vectors along the segment from waypoint i - 1 to waypoint i and to the left of it
+    """
+
+    _instances = WeakValueDictionary()
+
+    def __init__(self, track_width: float, arrays: Dict[str, np.ndarray]):
+        self.track_width = track_width
+        self.points = arrays['points']
+        self.segment_lengths = arrays['segment_lengths']
+        self.radii = arrays['radii']
+        self.tangents = arrays['tangents']
+        self.normals = arrays['normals']
+        self.length = float(self.segment_lengths.sum())
+        self._target_speeds = {}
+        for array in arrays.values():
+            array.flags.writeable = False
+
+    @classmethod
+    def of(cls, track: Track) -> 'TrackGeometry':
+        key = track_id(track)
+        geometry = cls._instances.get(key)
+        if geometry is None:
+            geometry = cls(track.track_width, cached('track_geometry', track, lambda: build_geometry(track)))
+            cls._instances[key] = geometry
+        return geometry
+
+    def __len__(self):
+        return len(self.points)
+
+    def target_speeds(self, corner_slow_down: float) -> np.ndarray:
+        """corner_slow_down times the radius at every waypoint, shared by all bots with the same corner_slow_down."""
+        target_speeds = self._target_speeds.get(corner_slow_down)
+        if target_speeds is None:
+            target_speeds = corner_slow_down * self.radii
+            target_speeds.flags.writeable = False
+            self._target_speeds[corner_slow_down] = target_speeds
+        return target_speeds
+
+
+def build_geometry(track: Track) -> Dict[str, np.ndarray]:
+    points = np.array([(p.x, p.y) for p in track.lines], dtype=float)
+    previous = np.roll(points, 1, axis=0)
+
+    segment_lengths = length(points - previous)
+    radii = calculate_radii(points)
+
+    tangents = (points - previous) / segment_lengths[:, np.newaxis]
+    normals = np.column_stack([-tangents[:, 1], tangents[:, 0]])
+
+    return {
+        'points': points,
+        'segment_lengths': segment_lengths,
+        'radii': radii,
+        'tangents': tangents,
+        'normals': normals,
+    }
+
+
+def calculate_radii(points: np.ndarray) -> np.ndarray:
+    """Radius of the circle through every point of a closed ring and its neighbours, inf where they are on a straight
+    line."""
+    previous = np.roll(points, 1, axis=0)
+    following = np.roll(points, -1, axis=0)
+    a = length(following - points)
+    b = length(previous - following)
+    c = length(previous - points)
+    area = 0.5 * np.abs(previous[:, 0] * (points[:, 1] - following[:, 1]) +
+                        points[:, 0] * (following[:, 1] - previous[:, 1]) +
+                        following[:, 0] * (previous[:, 1] - points[:, 1]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        radii = a * b * c / (4 * area)
+    radii[area == 0] = np.inf
+    return radii
+
+
+def length(v: np.ndarray) -> np.ndarray:
+    """Length of every row, computed like Vector2.length."""
+    return np.sqrt(v[:, 0] * v[:, 0] + v[:, 1] * v[:, 1])
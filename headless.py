@@ -0,0 +1,92 @@
+from copy import deepcopy
+from math import atan2
+from time import perf_counter
+from typing import List, Optional, Tuple, Union, Type
+
+import numpy as np
+from pygame import Vector2
+
+from .recording import RaceRecorder
+from ...bot import Bot
+from ...car_info import CarPhysics
+from ...constants import framerate
+from ...linear_math import Rotation, Transform
+from ...track import Track
+
+
+class RaceResult:
+    """Outcome of a headless race.
+
+    lap_times holds the duration of every completed lap, splits holds (lap, waypoint, race time) for every waypoint that
+    was reached and compute_times the wall-clock duration of every compute_commands call.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.finished = False
+        self.time = 0.
+        self.lap_times: List[float] = []
+        self.splits: List[Tuple[int, int, float]] = []
+        self.compute_times = np.empty(0)
+
+    @property
+    def race_time(self) -> float:
+        return self.time if self.finished else float('inf')
+
+    def __repr__(self):
+        return (f'{self.name}: laps={self.lap_times} finished={self.finished} '
+                f'compute={1e3 * self.compute_times.mean():.3f}ms/frame')
+
+
+def start_position(track: Track) -> Tuple[Transform, Vector2, int]:
+    """Stand still at the last waypoint, facing the first waypoint."""
+    start, first = track.lines[-1], track.lines[0]
+    heading = atan2(first.y - start.y, first.x - start.x)
+    return Transform(Rotation.fromangle(heading), Vector2(start)), Vector2(0, 0), 0
+
+
+def race(bot: Union[Bot, Type[Bot]], track: Track, laps: int = 1, max_time: float = 300.,
+         dt: float = 1 / framerate, recording: Optional[str] = None) -> RaceResult:
+    """Drive a bot around the track with fixed time steps, as fast as the CPU allows.
+
+    `bot` is a bot instance or a bot class, which is then instantiated for the track. The physics and waypoint rules
+    are those of the game, but nothing is drawn. A lap is completed when the car is back at the start waypoint, and
+    the race is aborted after max_time seconds of race time. With `recording`, every frame is recorded to that file.
+    """
+    if isinstance(bot, type):
+        bot = bot(track)
+    result = RaceResult(bot.name)
+    recorder = RaceRecorder(recording, bot) if recording else None
+
+    position, velocity, next_waypoint = start_position(track)
+    car = CarPhysics(position, velocity)
+    compute_times = []
+    lap = 0
+    steps = int(max_time / dt)
+    try:
+        for step in range(1, steps + 1):
+            start = perf_counter()
+            throttle, steering_command = bot.compute_commands(next_waypoint, deepcopy(car.position),
+                                                              Vector2(car.velocity))
+            compute_times.append(perf_counter() - start)
+
+            car.update(dt, throttle, steering_command)
+            result.time = step * dt
+
+            if (track.lines[next_waypoint] - car.position.p).length() < track.track_width:
+                result.splits.append((lap, next_waypoint, result.time))
+                next_waypoint += 1
+                if next_waypoint >= len(track.lines):
+                    next_waypoint = 0
+                if next_waypoint == 0:
+                    lap += 1
+                    result.lap_times.append(result.time - sum(result.lap_times))
+                    if lap >= laps:
+                        result.finished = True
+                        break
+    finally:
+        # a bot that raises is unpatched and its recording closed all the same
+        if recorder:
+            recorder.close()
+    result.compute_times = np.array(compute_times)
+    return result
@@ -0,0 +1,165 @@
+import atexit
+import os
+import sys
+from contextlib import nullcontext
+from functools import wraps
+from time import perf_counter_ns
+from typing import Dict, Tuple
+
+from ...constants import framerate
+
+# Histogram buckets: exact below 16 ns, then 8 buckets per power of two (12.5% resolution) up to about 20 minutes
+SUB_BUCKETS = 8
+N_BUCKETS = SUB_BUCKETS * 40
+
+
+def bucket_index(ns: int) -> int:
+    if ns < 2 * SUB_BUCKETS:
+        return ns
+    shift = ns.bit_length() - 4
+    return min(shift * SUB_BUCKETS + (ns >> shift), N_BUCKETS - 1)
+
+
+def bucket_start(index: int) -> int:
+    if index < 2 * SUB_BUCKETS:
+        return index
+    return (index % SUB_BUCKETS + SUB_BUCKETS) << (index // SUB_BUCKETS - 1)
+
+
+class LatencyHistogram:
+    """Fixed-size histogram of durations in nanoseconds, with the number of durations over a budget. It takes any
+    non-negative integers, which is how `Instrumentation.count` uses it."""
+    __slots__ = ('counts', 'count', 'total', 'max', 'budget', 'overruns')
+
+    def __init__(self, budget: int):
+        self.counts = [0] * N_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.budget = budget
+        self.overruns = 0
+
+    def record(self, ns: int):
+        self.counts[bucket_index(ns)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+        if ns > self.budget:
+            self.overruns += 1
+
+    def percentile(self, q: float) -> int:
+        """Upper bound of the q-th percentile (0 to 100): the largest value of its bucket."""
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(bucket_start(i + 1) - 1, self.max)
+        return self.max
+
+
+class Instrumentation:
+    """Opt-in latency measurements of the bots, per bot name and phase.
+
+    Bots decorate their entry points with `timed` and wrap the interesting parts of a frame in `phase`. Both cost a
+    single flag check while disabled. Values that are not durations, like the age of a plan in ticks, are recorded
+    with `count` into histograms of their own. Enable it with `enable()` or by setting RACER_INSTRUMENTATION=1.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.budget = int(1e9 / framerate)
+        self.histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.counts: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self._report_registered = False
+
+    def enable(self, report_at_exit: bool = True):
+        self.enabled = True
+        if report_at_exit and not self._report_registered:
+            atexit.register(self.report)
+            self._report_registered = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.histograms.clear()
+        self.counts.clear()
+
+    def record(self, bot_name: str, phase: str, ns: int):
+        histogram = self.histograms.get((bot_name, phase))
+        if histogram is None:
+            histogram = self.histograms[bot_name, phase] = LatencyHistogram(self.budget)
+        histogram.record(ns)
+
+    def count(self, bot_name: str, name: str, value: int = 1):
+        """Record a non-negative integer that is not a duration; without a value, count an event."""
+        histogram = self.counts.get((bot_name, name))
+        if histogram is None:
+            histogram = self.counts[bot_name, name] = LatencyHistogram(sys.maxsize)
+        histogram.record(value)
+
+    def phase(self, bot, name: str):
+        if not self.enabled:
+            return _null_phase
+        return _Phase(self, bot.name, name)
+
+    def timed(self, name: str):
+        """Decorator that records every call of a bot method as phase `name`."""
+
+        def decorator(method):
+            @wraps(method)
+            def wrapper(bot, *args, **kwargs):
+                if not self.enabled:
+                    return method(bot, *args, **kwargs)
+                start = perf_counter_ns()
+                try:
+                    return method(bot, *args, **kwargs)
+                finally:
+                    self.record(bot.name, name, perf_counter_ns() - start)
+
+            return wrapper
+
+        return decorator
+
+    def summary(self) -> str:
+        lines = [f'{"bot":<20} {"phase":<18} {"calls":>8} {"p50":>9} {"p95":>9} {"p99":>9} {"max":>9} {"overruns":>8}']
+        for (bot_name, phase), h in sorted(self.histograms.items()):
+            p50, p95, p99 = (h.percentile(q) / 1e6 for q in (50, 95, 99))
+            lines.append(f'{bot_name:<20} {phase:<18} {h.count:>8} {p50:>7.3f}ms {p95:>7.3f}ms {p99:>7.3f}ms '
+                         f'{h.max / 1e6:>7.3f}ms {h.overruns:>8}')
+        if self.counts:
+            lines.append(f'{"bot":<20} {"count":<18} {"calls":>8} {"p50":>9} {"p95":>9} {"p99":>9} {"max":>9} '
+                         f'{"mean":>8}')
+            for (bot_name, name), h in sorted(self.counts.items()):
+                p50, p95, p99 = (h.percentile(q) for q in (50, 95, 99))
+                lines.append(f'{bot_name:<20} {name:<18} {h.count:>8} {p50:>9} {p95:>9} {p99:>9} {h.max:>9} '
+                             f'{h.total / h.count:>8.2f}')
+        return '\n'.join(lines)
+
+    def report(self, file=None):
+        if self.histograms or self.counts:
+            print(self.summary(), file=file or sys.stderr)
+
+
+class _Phase:
+    __slots__ = ('instrumentation', 'bot_name', 'name', 'start')
+
+    def __init__(self, instrumentation: Instrumentation, bot_name: str, name: str):
+        self.instrumentation = instrumentation
+        self.bot_name = bot_name
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+
+    def __exit__(self, *exc):
+        self.instrumentation.record(self.bot_name, self.name, perf_counter_ns() - self.start)
+
+
+_null_phase = nullcontext()
+
+instrumentation = Instrumentation()
+if os.environ.get('RACER_INSTRUMENTATION'):
+    instrumentation.enable()
@@ -0,0 +1,27 @@
+from typing import Callable
+
+import pygame
+from pygame import Surface
+
+
+class Overlay:
+    """Static debug drawing of a bot, rendered once into a transparent Surface and blitted in a single call.
+
+    `render(surface, zoom)` draws everything that only depends on the track and the config. It is called again when
+    the zoom or the size of the map changes. Bots create a new overlay in `init`, so a changed config is redrawn too.
+    """
+
+    def __init__(self, render: Callable[[Surface, float], None]):
+        self.render = render
+        self.key = None
+        self.surface = None
+
+    def draw(self, map_scaled: Surface, zoom: float):
+        key = (map_scaled.get_size(), zoom)
+        if key != self.key:
+            self.surface = Surface(map_scaled.get_size(), pygame.SRCALPHA)
+            self.render(self.surface, zoom)
+            # run-length encoding makes blitting the mostly transparent surface about as cheap as its content
+            self.surface.set_alpha(255, pygame.RLEACCEL)
+            self.key = key
+        map_scaled.blit(self.surface, (0, 0))
@@ -1,18 +1,18 @@
-import json
 from argparse import Namespace
 from math import radians
-from socket import socket, AF_INET, SOCK_DGRAM
 from typing import Tuple
 
 import pygame
 from pygame import Vector2, Color
 
-from .utils import normalize_angle, calculate_target_speeds, calculate_target_speed
+from .geometry import TrackGeometry
+from .instrumentation import instrumentation
+from .speed_profile import SpeedProfile
+from .telemetry import telemetry
+from .utils import needs_init, normalize_angle
 from ...bot import Bot
 from ...linear_math import Transform
 
-DEBUG = False
-
 
 class PID(Bot):
     def __init__(self, track):
@@ -22,12 +22,20 @@ class PID(Bot):
             corner_slow_down=1.4250013202302734,
             p=4.642214730859962,
             d=11.364402700385446,
+            # the car brakes for the waypoints until speed_window waypoints ahead
+            speed_window=10,
         )
         self.previous_error = 0
-        self.target_speeds = calculate_target_speeds(track, self.config.corner_slow_down)
-        if DEBUG:
-            self.sock = socket(AF_INET, SOCK_DGRAM)
-            self.server_address = ('127.0.0.1', 12389)
+        self.initialized = False
+        self.channel = telemetry.channel(self.name, ('reference', 'measured', 'steering_command'))
+
+    def init(self):
+        self.geometry = TrackGeometry.of(self.track)
+        self.target_speeds = self.geometry.target_speeds(self.config.corner_slow_down)
+        self.speed_profile = SpeedProfile(self.geometry.points, self.target_speeds, self.config.deceleration,
+                                          segment_lengths=self.geometry.segment_lengths,
+                                          window=self.config.speed_window)
+        self.initialized = True
 
     @property
     def name(self):
@@ -41,6 +49,8 @@ class PID(Bot):
     def color(self):
         return Color(0, 200, 0)
 
+    @instrumentation.timed('compute_commands')
+    @needs_init
     def compute_commands(self, next_waypoint: int, position: Transform, velocity: Vector2) -> Tuple:
         target = self.track.lines[next_waypoint]
 
@@ -48,8 +58,8 @@ class PID(Bot):
         measured = radians((velocity.as_polar()[1]))
         error = normalize_angle(reference - measured)
 
-        target_speed = calculate_target_speed(self.track, position, next_waypoint, self.target_speeds,
-                                              self.config.deceleration)
+        with instrumentation.phase(self, 'target_speed'):
+            target_speed = self.speed_profile(position, next_waypoint)
         if target_speed < velocity.length():
             throttle = -1
         else:
@@ -61,17 +71,13 @@ class PID(Bot):
         self.position = position
         self.velocity = velocity
 
-        if DEBUG:
-            data = {
-                'reference': reference,
-                'measured': measured,
-                'steering_command': steering_command,
-            }
-            print(data)
-            self.sock.sendto(json.dumps(data).encode('utf-8'), self.server_address)
+        if telemetry.enabled:
+            self.channel.record(reference, measured, steering_command)
 
         return throttle, steering_command
 
+    @instrumentation.timed('draw')
+    @needs_init
     def draw(self, map_scaled, zoom):
         target = self.position.p + self.velocity
         pygame.draw.line(map_scaled, (255, 0, 0), self.position.p * zoom, target * zoom, 2)
@@ -0,0 +1,194 @@
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from math import atan2, floor
+from os import cpu_count
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pygame import Vector2
+
+from .cache import cached
+from .geometry import TrackGeometry
+from .headless import race
+from .rollout import Rollout
+from ...bot import Bot
+from ...constants import framerate
+from ...linear_math import Transform
+from ...track import Track
+
+# The config fields the chosen commands depend on
+POLICY_CONFIG = ('corner_slow_down', 'deceleration', 'w_waypoint', 'w_speed', 'n', 'n_throttle', 'n_steering')
+
+# Grid sizes of the progress along the segment, the lateral offset, the heading error, and the forward and sideways
+# speed
+SIZES = (9, 7, 13, 8, 5)
+
+# Every axis spans the states of this fraction of the frames of a race driven with the live grid search
+COVERAGE = 0.98
+
+# Number of rollouts simulated at once while building
+BATCH = 1 << 16
+
+
+def track_state(geometry: TrackGeometry, next_waypoint: int, position: Transform,
+                velocity: Vector2) -> Tuple[float, ...]:
+    """Progress along the segment towards next_waypoint (as a fraction of the segment), lateral offset from it,
+    heading relative to it, and forward and sideways speed."""
+    (ax, ay), (tx, ty) = geometry.points[next_waypoint - 1], geometry.tangents[next_waypoint]
+    dx, dy = position.p.x - ax, position.p.y - ay
+    hx, hy = position.M.cols[0]
+    return ((dx * tx + dy * ty) / geometry.segment_lengths[next_waypoint],
+            dy * tx - dx * ty,
+            atan2(hy * tx - hx * ty, hx * tx + hy * ty),
+            velocity.x * hx + velocity.y * hy,
+            velocity.y * hx - velocity.x * hy)
+
+
+def observe_states(bot: Bot, max_time: float = 300.) -> np.ndarray:
+    """Track states (m, 5) of every frame of a lap that a copy of the bot drives with the live grid search."""
+    driver = type(bot)(bot.track)
+    driver.config = Namespace(**{**vars(bot.config), 'planner': 'grid', 'asynchronous': False})
+    driver.init()
+    states = []
+    compute_commands = driver.compute_commands
+
+    def observe(next_waypoint: int, position: Transform, velocity: Vector2) -> Tuple:
+        states.append(track_state(driver.geometry, next_waypoint, position, velocity))
+        return compute_commands(next_waypoint, position, velocity)
+
+    driver.compute_commands = observe
+    race(driver, bot.track, max_time=max_time)
+    return np.array(states)
+
+
+def state_axes(lows: np.ndarray, highs: np.ndarray) -> Tuple[np.ndarray, ...]:
+    return tuple(np.linspace(low, high, size) for low, high, size in zip(lows, highs, SIZES))
+
+
+def build_rows(track: Track, config: Namespace, axes: Sequence[np.ndarray],
+               waypoints: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Run the grid search of Dustrider from every grid state of some waypoints."""
+    geometry = TrackGeometry.of(track)
+    shape = tuple(len(a) for a in axes)
+    progress, lateral, heading, speed, slip = (a.ravel() for a in np.meshgrid(*axes, indexing='ij'))
+    throttle, steering_command = np.meshgrid(np.linspace(-1, 1, config.n_throttle),
+                                             np.linspace(-1, 1, config.n_steering), indexing='ij')
+    throttle, steering_command = throttle.ravel(), steering_command.ravel()
+    n_states, n_candidates = len(progress), len(throttle)
+
+    # every batch simulates all candidates of `batch` states; the last one is padded with copies of the last state
+    batch = max(1, min(n_states, BATCH // n_candidates))
+    rollout = Rollout(geometry, geometry.target_speeds(config.corner_slow_down), batch * n_candidates, config.n)
+    throttle, steering_command = np.tile(throttle, batch), np.tile(steering_command, batch)
+
+    throttles = np.empty((len(waypoints), n_states))
+    steering_commands = np.empty((len(waypoints), n_states))
+    for row, k in enumerate(waypoints):
+        start, tangent, normal = geometry.points[k - 1], geometry.tangents[k], geometry.normals[k]
+        segment = geometry.points[k] - start
+
+        for first in range(0, n_states, batch):
+            states = np.minimum(np.arange(first, first + batch), n_states - 1)
+            p = start + progress[states, np.newaxis] * segment + lateral[states, np.newaxis] * normal
+            forward = np.cos(heading[states])[:, np.newaxis] * tangent + np.sin(heading[states])[:, np.newaxis] * normal
+            side = np.column_stack([-forward[:, 1], forward[:, 0]])
+            v = speed[states, np.newaxis] * forward + slip[states, np.newaxis] * side
+
+            rollout.reset_states(k, *(np.repeat(a, n_candidates, axis=0) for a in (p, forward, v)))
+            rollout.advance(1 / framerate, throttle, steering_command)
+            best = np.argmin(rollout.cost(k, config).reshape(batch, n_candidates), axis=1)
+
+            end = min(first + batch, n_states)
+            throttles[row, first:end] = throttle[best[:end - first]]
+            steering_commands[row, first:end] = steering_command[best[:end - first]]
+    return throttles.reshape((-1,) + shape), steering_commands.reshape((-1,) + shape)
+
+
+def _build_rows(args) -> Tuple[np.ndarray, np.ndarray]:
+    return build_rows(*args)
+
+
+def build_policy(bot: Bot, workers: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Size the axes from the states of a lap driven with the live grid search, then build the whole table, spread
+    over a process pool by waypoint."""
+    states = observe_states(bot)
+    lows, highs = np.quantile(states, [(1 - COVERAGE) / 2, (1 + COVERAGE) / 2], axis=0)
+    axes = state_axes(lows, highs)
+    waypoints = np.arange(len(bot.track.lines))
+    if workers == 1:
+        rows = [build_rows(bot.track, bot.config, axes, waypoints)]
+    else:
+        chunks = np.array_split(waypoints, min(len(waypoints), 4 * (workers or cpu_count() or 1)))
+        with ProcessPoolExecutor(workers) as pool:
+            rows = list(pool.map(_build_rows, [(bot.track, bot.config, axes, chunk) for chunk in chunks]))
+    return {
+        'throttle': np.concatenate([throttle for throttle, _ in rows]),
+        'steering_command': np.concatenate([steering_command for _, steering_command in rows]),
+        'lows': lows,
+        'highs': highs,
+    }
+
+
+class PolicyTable:
+    """Commands of Dustrider's grid search, precomputed for a grid of track-local states (see `track_state`).
+
+    The axes span the states that the car went through in a lap with the live grid search, so the table is specific
+    to a track and config. `lookup` only answers for states inside the grid. The table is built offline, in parallel,
+    and cached on disk per track and config; it takes about a minute per 50 waypoints on one CPU.
+
+    Dustrider drives with it when planner='table', and searches the grid live where it does not answer. On the synthetic
+    benchmark tracks it answers only part of the frames and drives slower laps; benchmarks/policy.py measures both.
+    """
+
+    def __init__(self, geometry: TrackGeometry, arrays: Dict[str, np.ndarray], interpolate: bool = False):
+        self.geometry = geometry
+        self.throttle = arrays['throttle']
+        self.steering_command = arrays['steering_command']
+        self.interpolate = interpolate
+
+        axes = state_axes(arrays['lows'], arrays['highs'])
+        self.lows = [float(a[0]) for a in axes]
+        self.steps = [float(a[1] - a[0]) if len(a) > 1 else 1. for a in axes]
+        self.sizes = [len(a) for a in axes]
+
+    @classmethod
+    def of(cls, bot: Bot, interpolate: bool = False, workers: Optional[int] = None) -> 'PolicyTable':
+        config = {name: getattr(bot.config, name) for name in POLICY_CONFIG}
+        arrays = cached('dustrider_policy', bot.track, lambda: build_policy(bot, workers), sizes=SIZES,
+                        coverage=COVERAGE, **config)
+        return cls(TrackGeometry.of(bot.track), arrays, interpolate)
+
+    def coordinates(self, next_waypoint: int, position: Transform, velocity: Vector2) -> Optional[List[float]]:
+        """State of the car in grid units, or None if the table does not cover it."""
+        coordinates = []
+        for value, low, step, size in zip(track_state(self.geometry, next_waypoint, position, velocity), self.lows,
+                                          self.steps, self.sizes):
+            c = (value - low) / step
+            # grid states themselves are covered despite rounding
+            if not -1e-9 <= c <= size - 1 + 1e-9:
+                return None
+            coordinates.append(min(max(c, 0.), size - 1.))
+        return coordinates
+
+    def lookup(self, next_waypoint: int, position: Transform, velocity: Vector2) -> Optional[Tuple[float, float]]:
+        """Throttle and steering command at the nearest grid state, or interpolated between the surrounding ones."""
+        coordinates = self.coordinates(next_waypoint, position, velocity)
+        if coordinates is None:
+            return None
+        if not self.interpolate:
+            i = (next_waypoint,) + tuple(int(c + 0.5) for c in coordinates)
+            return float(self.throttle[i]), float(self.steering_command[i])
+
+        lower = [min(floor(c), size - 2) if size > 1 else 0 for c, size in zip(coordinates, self.sizes)]
+        fractions = [c - i for c, i in zip(coordinates, lower)]
+        throttle = steering_command = 0.
+        for corner in product((0, 1), repeat=len(lower)):
+            weight = 1.
+            for bit, fraction in zip(corner, fractions):
+                weight *= fraction if bit else 1 - fraction
+            if weight:
+                i = (next_waypoint,) + tuple(j + bit for j, bit in zip(lower, corner))
+                throttle += weight * self.throttle[i]
+                steering_command += weight * self.steering_command[i]
+        return float(throttle), float(steering_command)
@@ -4,7 +4,10 @@ from typing import Tuple
 import pygame
 from pygame import Vector2, Color
 
-from .utils import calculate_target_speeds, calculate_target_speed
+from .geometry import TrackGeometry
+from .instrumentation import instrumentation
+from .speed_profile import SpeedProfile
+from .utils import needs_init
 from ...bot import Bot
 from ...linear_math import Transform
 
@@ -15,8 +18,18 @@ class PurePursuit(Bot):
         self.config = Namespace(
             corner_slow_down=1.2785291990662067,
             deceleration=122.35751522686678,
+            # the car brakes for the waypoints until speed_window waypoints ahead
+            speed_window=10,
         )
-        self.target_speeds = calculate_target_speeds(track, self.config.corner_slow_down)
+        self.initialized = False
+
+    def init(self):
+        self.geometry = TrackGeometry.of(self.track)
+        self.target_speeds = self.geometry.target_speeds(self.config.corner_slow_down)
+        self.speed_profile = SpeedProfile(self.geometry.points, self.target_speeds, self.config.deceleration,
+                                          segment_lengths=self.geometry.segment_lengths,
+                                          window=self.config.speed_window)
+        self.initialized = True
 
     @property
     def name(self):
@@ -30,6 +43,8 @@ class PurePursuit(Bot):
     def color(self):
         return Color(200, 200, 0)
 
+    @instrumentation.timed('compute_commands')
+    @needs_init
     def compute_commands(self, next_waypoint: int, position: Transform, velocity: Vector2) -> Tuple:
         target = self.track.lines[next_waypoint]
         # calculate the target in the frame of the robot
@@ -37,8 +52,8 @@ class PurePursuit(Bot):
         # calculate the angle to the target
         angle = target.as_polar()[1]
 
-        target_speed = calculate_target_speed(self.track, position, next_waypoint, self.target_speeds,
-                                              self.config.deceleration)
+        with instrumentation.phase(self, 'target_speed'):
+            target_speed = self.speed_profile(position, next_waypoint)
         try:
             gamma = 2 * target.y / target.length_squared()
         except ZeroDivisionError:
@@ -56,6 +71,8 @@ class PurePursuit(Bot):
 
         return throttle, angular_velocity
 
+    @instrumentation.timed('draw')
+    @needs_init
     def draw(self, map_scaled, zoom):
         target = self.position.p + self.velocity
         pygame.draw.line(map_scaled, (255, 0, 0), self.position.p * zoom, target * zoom, 2)
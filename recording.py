@@ -0,0 +1,147 @@
+import json
+import os
+import struct
+from time import perf_counter
+from typing import Dict, Optional, Tuple, Type, Union
+
+import numpy as np
+from pygame import Vector2
+
+from .cache import track_id
+from ...bot import Bot
+from ...linear_math import Rotation, Transform
+from ...track import Track
+
+# File layout: MAGIC, the header length, a JSON header padded to a multiple of 64 bytes, then one FRAME per
+# compute_commands call. Frames are only ever appended, and the frames of a file are read memory mapped.
+MAGIC = b'RACEREC1'
+LENGTH = struct.Struct('<I')
+ALIGNMENT = 64
+
+# The rotation is stored as its two columns, so a replayed position is bit for bit the recorded one
+FRAME = np.dtype([
+    ('next_waypoint', '<i4'),
+    ('rotation', '<f8', (2, 2)),
+    ('position', '<f8', 2),
+    ('velocity', '<f8', 2),
+    ('throttle', '<f8'),
+    ('steering_command', '<f8'),
+])
+
+
+class RaceRecorder:
+    """Records the inputs and outputs of every compute_commands call of a bot to a file, until it is closed or the
+    with block around it is left."""
+
+    def __init__(self, path: str, bot: Bot):
+        header = json.dumps({
+            'bot': bot.name,
+            'class': f'{type(bot).__module__}.{type(bot).__qualname__}',
+            'track': track_id(bot.track),
+            'config': vars(bot.config) if hasattr(bot, 'config') else {},
+            'dtype': FRAME.descr,
+        }).encode('utf-8')
+        size = len(MAGIC) + LENGTH.size + len(header)
+        header += b' ' * (-size % ALIGNMENT)
+
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC + LENGTH.pack(len(header)) + header)
+        self.frame = np.zeros(1, FRAME)
+        self.bot = bot
+        self.compute_commands = bot.compute_commands
+        bot.compute_commands = self.record
+
+    def record(self, next_waypoint: int, position: Transform, velocity: Vector2) -> Tuple:
+        # the bot may change the inputs, so they are stored first
+        frame = self.frame[0]
+        frame['next_waypoint'] = next_waypoint
+        frame['rotation'] = position.M.cols
+        frame['position'] = position.p
+        frame['velocity'] = velocity
+        throttle, steering_command = self.compute_commands(next_waypoint, position, velocity)
+        frame['throttle'] = throttle
+        frame['steering_command'] = steering_command
+        self.file.write(self.frame.tobytes())
+        return throttle, steering_command
+
+    def close(self):
+        del self.bot.compute_commands
+        self.file.close()
+
+    def __enter__(self) -> 'RaceRecorder':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Recording:
+    """A recording file: the header dict and the frames as a read-only memory mapped structured array."""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} is not a race recording')
+            length, = LENGTH.unpack(f.read(LENGTH.size))
+            self.header: Dict = json.loads(f.read(length))
+        offset = len(MAGIC) + LENGTH.size + length
+        # a frame that was only partially written is ignored
+        n = (os.path.getsize(path) - offset) // FRAME.itemsize
+        self.frames = np.memmap(path, FRAME, 'r', offset, (n,)) if n else np.zeros(0, FRAME)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def inputs(self, i: int):
+        """The arguments of compute_commands of frame i."""
+        frame = self.frames[i]
+        c0, c1 = frame['rotation']
+        return (int(frame['next_waypoint']), Transform(Rotation(Vector2(*c0), Vector2(*c1)),
+                                                       Vector2(*frame['position'])), Vector2(*frame['velocity']))
+
+
+class ReplayResult:
+    """Per-frame replayed outputs, their difference to the recorded outputs and the duration of every call."""
+
+    def __init__(self, recording: Recording, throttle: np.ndarray, steering_command: np.ndarray,
+                 compute_times: np.ndarray):
+        self.throttle = throttle
+        self.steering_command = steering_command
+        self.throttle_diff = np.abs(throttle - recording.frames['throttle'])
+        self.steering_diff = np.abs(steering_command - recording.frames['steering_command'])
+        self.compute_times = compute_times
+
+    def differing_frames(self, tolerance: float = 0.) -> np.ndarray:
+        return np.flatnonzero((self.throttle_diff > tolerance) | (self.steering_diff > tolerance))
+
+    def __repr__(self):
+        differing = self.differing_frames()
+        first = differing[0] if len(differing) else None
+        times = 1e3 * self.compute_times
+        return (f'{len(times)} frames, {len(differing)} differ (first {first}, max throttle diff '
+                f'{self.throttle_diff.max(initial=0):.3g}, max steering diff {self.steering_diff.max(initial=0):.3g}), '
+                f'compute {times.mean():.3f}ms mean / {np.percentile(times, 99):.3f}ms p99')
+
+
+def replay(bot: Union[Bot, Type[Bot]], recording: Union[str, Recording], track: Optional[Track] = None,
+           check_track: bool = True) -> ReplayResult:
+    """Feed the recorded inputs to a bot as fast as possible and compare its outputs to the recorded ones.
+
+    `bot` is a bot instance, or a bot class that is instantiated for `track`. The frames are replayed in order, so
+    bots that keep state between frames see the same history as in the recorded race.
+    """
+    if isinstance(recording, str):
+        recording = Recording(recording)
+    if isinstance(bot, type):
+        bot = bot(track)
+    if check_track and track_id(bot.track) != recording.header['track']:
+        raise ValueError('The recording was made on a different track')
+
+    n = len(recording)
+    throttle, steering_command, compute_times = np.empty(n), np.empty(n), np.empty(n)
+    for i in range(n):
+        next_waypoint, position, velocity = recording.inputs(i)
+        start = perf_counter()
+        throttle[i], steering_command[i] = bot.compute_commands(next_waypoint, position, velocity)
+        compute_times[i] = perf_counter() - start
+    return ReplayResult(recording, throttle, steering_command, compute_times)
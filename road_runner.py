@@ -1,11 +1,15 @@
-import json
 from argparse import Namespace
-from socket import socket, AF_INET, SOCK_DGRAM
+from functools import cached_property
 from typing import Tuple
 
 from pygame import Vector2, Color, Surface, font
 
-from .utils import calculate_target_speeds, calculate_target_speed
+from .geometry import TrackGeometry
+from .instrumentation import instrumentation
+from .overlay import Overlay
+from .speed_profile import SpeedProfile
+from .telemetry import telemetry
+from .utils import needs_init
 from ...bot import Bot
 from ...linear_math import Transform
 from ...track import Track
@@ -19,12 +23,24 @@ class RoadRunner(Bot):
         self.config = Namespace(
             corner_slow_down=1.3344255280275334,
             deceleration=125.64971221205201,
+            # the car brakes for the waypoints until speed_window waypoints ahead
+            speed_window=10,
         )
-        self.target_speeds = calculate_target_speeds(track, self.config.corner_slow_down)
-        self.font = font.SysFont('', 20)
-        if DEBUG:
-            self.sock = socket(AF_INET, SOCK_DGRAM)
-            self.server_address = ('127.0.0.1', 12389)
+        self.initialized = False
+        self.channel = telemetry.channel(self.name, ('angle', 'speed', 'max_speed'))
+
+    def init(self):
+        self.geometry = TrackGeometry.of(self.track)
+        self.target_speeds = self.geometry.target_speeds(self.config.corner_slow_down)
+        self.speed_profile = SpeedProfile(self.geometry.points, self.target_speeds, self.config.deceleration,
+                                          segment_lengths=self.geometry.segment_lengths,
+                                          window=self.config.speed_window)
+        self.overlay = Overlay(self.draw_overlay)
+        self.initialized = True
+
+    @cached_property
+    def font(self):
+        return font.SysFont('', 20)
 
     @property
     def name(self):
@@ -38,6 +54,8 @@ class RoadRunner(Bot):
     def color(self):
         return Color(200, 200, 0)
 
+    @instrumentation.timed('compute_commands')
+    @needs_init
     def compute_commands(self, next_waypoint: int, position: Transform, velocity: Vector2) -> Tuple:
         target = self.track.lines[next_waypoint]
         next_target = self.track.lines[(next_waypoint + 1) % len(self.track.lines)]
@@ -47,16 +65,11 @@ class RoadRunner(Bot):
         # calculate the angle to the target
         angle = relative_target.as_polar()[1]
 
-        max_speed = calculate_target_speed(self.track, position, next_waypoint, self.target_speeds,
-                                           self.config.deceleration)
+        with instrumentation.phase(self, 'target_speed'):
+            max_speed = self.speed_profile(position, next_waypoint)
 
-        if DEBUG:
-            data = {
-                'angle': angle,
-                'speed': velocity.length(),
-                'max_speed': max_speed,
-            }
-            self.sock.sendto(json.dumps(data).encode('utf-8'), self.server_address)
+        if telemetry.enabled:
+            self.channel.record(angle, velocity.length(), max_speed)
 
         if velocity.length() < max_speed:
             throttle = 1
@@ -69,21 +82,18 @@ class RoadRunner(Bot):
         else:
             return throttle, -1
 
+    @instrumentation.timed('draw')
+    @needs_init
     def draw(self, map_scaled: Surface, zoom):
         if DEBUG:
-            # Draw the target speeds
-            for i, target_speed in enumerate(self.target_speeds):
-                text = self.font.render(f'{target_speed:.2f}', True, (0, 0, 0))
-                map_scaled.blit(text, (self.track.lines[i].x * zoom, self.track.lines[i].y * zoom))
-
-            for i, target_speed in enumerate(self.target_speeds):
-                p0 = self.track.lines[(i - 1) % len(self.track.lines)]
-                p1 = self.track.lines[i]
-                p2 = self.track.lines[(i + 1) % len(self.track.lines)]
-                a = (p2 - p1).length()
-                b = (p0 - p2).length()
-                c = (p0 - p1).length()
-                area = 0.5 * abs(p0.x * (p1.y - p2.y) + p1.x * (p2.y - p0.y) + p2.x * (p0.y - p1.y))
-                R = a * b * c / (4 * area)
-                text = self.font.render(f'{R:.2f}', True, (200, 0, 0))
-                map_scaled.blit(text, (p1.x * zoom, (p1.y + 20) * zoom))
+            self.overlay.draw(map_scaled, zoom)
+
+    def draw_overlay(self, surface: Surface, zoom):
+        # Draw the target speeds
+        for i, target_speed in enumerate(self.target_speeds):
+            text = self.font.render(f'{target_speed:.2f}', True, (0, 0, 0))
+            surface.blit(text, (self.track.lines[i].x * zoom, self.track.lines[i].y * zoom))
+
+        for p1, R in zip(self.track.lines, self.geometry.radii):
+            text = self.font.render(f'{R:.2f}', True, (200, 0, 0))
+            surface.blit(text, (p1.x * zoom, (p1.y + 20) * zoom))
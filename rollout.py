@@ -0,0 +1,113 @@
+from argparse import Namespace
+from typing import List
+
+import numpy as np
+from pygame import Vector2
+
+from .geometry import TrackGeometry
+from ...constants import max_throttle, max_steering_speed, slipping_acceleration
+from ...linear_math import Transform
+
+
+class Rollout:
+    """A batch of simulated cars that is advanced in lock step.
+
+    Every candidate's state lives in a row of the arrays below, so one call to `update` advances all candidates by one
+    tick. `update` is a transcription of `CarPhysics.update` and of the game's waypoint rule and has to be kept in sync
+    with them.
+
+    All buffers are allocated once, so the same rollout can be reset and reused for every frame. The positions of every
+    tick are kept in `trajectory`, which has shape (n + 1, size, 2).
+    """
+    __slots__ = ('waypoints', 'track_width', 'target_speeds', 'size', 'n', 'p', 'heading', 'v', 'next_waypoint',
+                 'trajectory', 'target_speed')
+
+    def __init__(self, geometry: TrackGeometry, target_speeds: List[float], size: int, n: int):
+        self.waypoints = geometry.points
+        self.track_width = geometry.track_width
+        self.target_speeds = np.asarray(target_speeds, dtype=float)
+        self.size = size
+        self.n = n
+
+        self.p = np.empty((size, 2))
+        self.heading = np.empty((size, 2))
+        self.v = np.empty((size, 2))
+        self.next_waypoint = np.empty(size, dtype=np.intp)
+        self.trajectory = np.empty((n + 1, size, 2))
+        self.target_speed = np.empty(size)
+
+    def reset(self, next_waypoint: int, position: Transform, velocity: Vector2):
+        self.p[:] = position.p
+        self.heading[:] = position.M.cols[0]
+        self.v[:] = velocity
+        self.next_waypoint[:] = next_waypoint
+
+    def reset_states(self, next_waypoint: np.ndarray, p: np.ndarray, heading: np.ndarray, v: np.ndarray):
+        """Start every candidate from its own state; heading is the first column of the rotation."""
+        self.p[:] = p
+        self.heading[:] = heading
+        self.v[:] = v
+        self.next_waypoint[:] = next_waypoint
+
+    def update(self, dt: float, throttle: np.ndarray, steering_command: np.ndarray):
+        throttle = np.clip(throttle, -1, 1)
+        steering_command = np.clip(steering_command, -1, 1)
+
+        # rotate the car
+        angle = steering_command * max_steering_speed * dt
+        c, s = np.cos(angle), np.sin(angle)
+        hx, hy = self.heading[:, 0].copy(), self.heading[:, 1]
+        self.heading[:, 0] = hx * c - hy * s
+        self.heading[:, 1] = hy * c + hx * s
+
+        # accelerate along the heading and let the sideways velocity slip towards zero
+        forward_speed = np.einsum('ij,ij->i', self.v, self.heading) + throttle * max_throttle * dt
+        side_speed = self.v[:, 1] * self.heading[:, 0] - self.v[:, 0] * self.heading[:, 1]
+        max_slip = slipping_acceleration * dt
+        side_speed -= np.clip(side_speed, -max_slip, max_slip)
+        self.v[:, 0] = self.heading[:, 0] * forward_speed - self.heading[:, 1] * side_speed
+        self.v[:, 1] = self.heading[:, 1] * forward_speed + self.heading[:, 0] * side_speed
+        self.p += self.v * dt
+
+        # update next waypoint
+        distance = np.hypot(*(self.waypoints[self.next_waypoint] - self.p).T)
+        reached = distance < self.track_width
+        self.next_waypoint[reached] += 1
+        self.next_waypoint[self.next_waypoint >= len(self.waypoints)] = 0
+
+    def simulate(self, next_waypoint: int, position: Transform, velocity: Vector2, throttle: np.ndarray,
+                 steering_command: np.ndarray, dt: float):
+        """Simulate all candidates for n ticks. The commands are either constant (shape (size,)) or one per tick
+        (shape (size, n))."""
+        self.reset(next_waypoint, position, velocity)
+        self.advance(dt, throttle, steering_command)
+
+    def advance(self, dt: float, throttle: np.ndarray, steering_command: np.ndarray):
+        """Simulate all candidates for n ticks from their current state."""
+        n = self.n
+        throttle = np.broadcast_to(np.asarray(throttle, dtype=float).reshape(self.size, -1), (self.size, n))
+        steering_command = np.broadcast_to(np.asarray(steering_command, dtype=float).reshape(self.size, -1),
+                                           (self.size, n))
+
+        self.trajectory[0] = self.p
+        for i in range(n):
+            self.update(dt, throttle[:, i], steering_command[:, i])
+            self.trajectory[i + 1] = self.p
+
+    def cost(self, start_waypoint: int, config: Namespace) -> np.ndarray:
+        """Score the end states the same way Dustrider scores a single simulation."""
+        n_waypoints = len(self.waypoints)
+
+        # cost 2
+        distance_to_next_waypoint = np.hypot(*(self.waypoints[self.next_waypoint] - self.p).T)
+
+        # cost 3
+        target_speed_at_waypoint = self.target_speeds[(self.next_waypoint + 1) % n_waypoints]
+        np.sqrt(target_speed_at_waypoint ** 2 + 2 * config.deceleration * distance_to_next_waypoint,
+                out=self.target_speed)
+        speed = np.hypot(*self.v.T)
+        velocity_diff = np.maximum(0., speed - self.target_speed) * config.w_speed
+
+        # total cost
+        progress = (self.next_waypoint - start_waypoint) % n_waypoints
+        return -config.w_waypoint * progress + distance_to_next_waypoint + velocity_diff
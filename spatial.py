@@ -0,0 +1,162 @@
+from math import hypot, sqrt, inf
+from typing import Optional, Tuple
+
+import numpy as np
+from pygame import Vector2
+
+# Largest distance in cells up to which nearest searches all cells around the car at once instead of ring by ring
+MAX_BLOCK = 4
+# Largest range of points that nearest compares one by one instead of searching the grid
+MAX_SCAN = 1024
+
+
+class PointIndex:
+    """Uniform grid over a fixed ring of points that answers nearest point queries.
+
+    A query can be warm started with the answer of the previous frame: walking along the ring from there gives a
+    close upper bound, so usually only the cells right around the car have to be searched. The grid search itself is
+    exact, so the answer is correct no matter how far the car is from the hint. A query can be restricted to the
+    points start until end (exclusive) of the ring, which wraps around if end <= start. Short ranges, like the
+    samples of one spline segment, are compared directly. Either way, the cost of a query does not grow with the
+    number of points, unless the car is far outside of the grid, where all points are compared at once.
+    """
+
+    def __init__(self, points: np.ndarray, max_climb: int = 32):
+        self.points = np.asarray(points, dtype=float)
+        self.max_climb = max_climb
+
+        # about ten points per cell: on a long track most of the bounding box is empty, so a cell size from its area
+        # would put more and more points into every cell
+        self.origin = self.points.min(axis=0)
+        width, height = self.points.max(axis=0) - self.origin
+        spacing = float(np.median(np.hypot(*np.diff(self.points, axis=0).T))) if len(self.points) > 1 else 0.
+        self.cell_size = (min(sqrt(width * height / len(self.points)), 8 * spacing) or
+                          max(width, height, 1.) / len(self.points))
+
+        # only the cells that hold points are stored, sorted by key, so the memory does not grow with the area
+        cells = ((self.points - self.origin) // self.cell_size).astype(np.int64)
+        self.shape = tuple(int(c) for c in cells.max(axis=0) + 1)
+        keys = cells[:, 0] * self.shape[1] + cells[:, 1]
+        # point indices fit into 32 bits on any track, which halves the largest array of the index
+        self.order = np.argsort(keys, kind='stable').astype(np.int32)
+        self.keys, first = np.unique(keys[self.order], return_index=True)
+        self.cell_starts = np.append(first, len(keys)).astype(np.int32)
+
+    def __len__(self):
+        return len(self.points)
+
+    def distance(self, i: int, p: Vector2) -> float:
+        x, y = self.points[i]
+        return hypot(x - p.x, y - p.y)
+
+    def nearest(self, p: Vector2, hint: Optional[int] = None, start: Optional[int] = None,
+                end: Optional[int] = None) -> int:
+        n = len(self.points)
+        if start is not None:
+            count = (end - start) % n or n
+            if count <= MAX_SCAN:
+                # comparing all points of a short range is cheaper than any search, however far away the car is
+                return self.closest(p, np.arange(start, start + count) % n, None, None, -1, inf)[0]
+
+        cx, cy = int((p.x - self.origin[0]) // self.cell_size), int((p.y - self.origin[1]) // self.cell_size)
+        if max(-cx, cx - self.shape[0] + 1, -cy, cy - self.shape[1] + 1) > MAX_BLOCK:
+            # far outside of the grid, the rings up to the nearest point would hold more cells than there are points
+            return self.closest(p, np.arange(n), start, end, -1, inf)[0]
+
+        if start is not None and hint is not None and not self.contains(hint, start, end):
+            hint = start
+        best, best_distance = -1, inf
+        if hint is not None:
+            best = self.climb(p, hint, start, end)
+            best_distance = self.distance(best, p)
+
+        if hint is None:
+            # queries are mostly close to the points, so the cells right around the car usually give a close bound
+            best, best_distance = self.closest(p, self.block(cx, cy, 1), start, end, best, best_distance)
+        # every point closer than the best one so far is in a cell at most `reach` cells away; if those are few, they
+        # are searched at once
+        reach = best_distance // self.cell_size + 1
+        if reach <= MAX_BLOCK:
+            return self.closest(p, self.block(cx, cy, int(reach)), start, end, best, best_distance)[0]
+
+        last_ring = max(abs(cx), abs(cx - self.shape[0] + 1), abs(cy), abs(cy - self.shape[1] + 1))
+        for k in range(last_ring + 1):
+            # every point in ring k is at least (k - 1) cells away
+            if (k - 1) * self.cell_size > best_distance:
+                break
+            best, best_distance = self.closest(p, self.ring(cx, cy, k), start, end, best, best_distance)
+        return best
+
+    def nearest_along(self, p: Vector2, hint: Optional[int], start: int, end: int, max_distance: float) -> int:
+        """The nearest point of the range start until end or, if that is more than max_distance away, of the half
+        ring up to end.
+
+        A car that left its range, like the segment towards a waypoint it has not reached yet, is led back along the
+        ring from the nearest point behind it, instead of on from points past that waypoint. On a long ring the half
+        ring is searched with the grid.
+        """
+        closest = self.nearest(p, hint, start, end)
+        if self.distance(closest, p) <= max_distance:
+            return closest
+        return self.nearest(p, closest, (end - len(self.points) // 2) % len(self.points), end)
+
+    def closest(self, p: Vector2, candidates: np.ndarray, start: Optional[int], end: Optional[int], best: int,
+                best_distance: float) -> Tuple[int, float]:
+        """The closest of the candidates in the range and the best point so far."""
+        if start is not None:
+            candidates = candidates[self.contains(candidates, start, end)]
+        if len(candidates):
+            distances = np.hypot(self.points[candidates, 0] - p.x, self.points[candidates, 1] - p.y)
+            i = np.argmin(distances)
+            if distances[i] < best_distance:
+                return int(candidates[i]), distances[i]
+        return best, best_distance
+
+    def climb(self, p: Vector2, i: int, start: Optional[int] = None, end: Optional[int] = None) -> int:
+        """Walk along the ring from i while the points get closer to p."""
+        n = len(self.points)
+        i = int(i)
+        distance = self.distance(i, p)
+        for _ in range(self.max_climb):
+            for j in ((i - 1) % n, (i + 1) % n):
+                if start is not None and not self.contains(j, start, end):
+                    continue
+                d = self.distance(j, p)
+                if d < distance:
+                    i, distance = j, d
+                    break
+            else:
+                break
+        return i
+
+    @staticmethod
+    def contains(i, start: int, end: int):
+        if start < end:
+            return (i >= start) & (i < end)
+        return (i >= start) | (i < end)
+
+    def ring(self, cx: int, cy: int, k: int) -> np.ndarray:
+        """Indices of the points in the cells at Chebyshev distance k from cell (cx, cy)."""
+        if k == 0:
+            return self.points_in(np.array([cx]), np.array([cy]))
+        side, inner = np.arange(-k, k + 1), np.arange(-k + 1, k)
+        return self.points_in(cx + np.concatenate([side, side, np.full(len(inner), -k), np.full(len(inner), k)]),
+                              cy + np.concatenate([np.full(len(side), -k), np.full(len(side), k), inner, inner]))
+
+    def block(self, cx: int, cy: int, k: int) -> np.ndarray:
+        """Indices of the points in the cells at Chebyshev distance k or less from cell (cx, cy)."""
+        offsets = np.arange(-k, k + 1)
+        return self.points_in(cx + np.repeat(offsets, 2 * k + 1), cy + np.tile(offsets, 2 * k + 1))
+
+    def points_in(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        """Indices of the points in the given cells, which may be outside of the grid."""
+        inside = (rows >= 0) & (rows < self.shape[0]) & (columns >= 0) & (columns < self.shape[1])
+        keys = rows[inside] * self.shape[1] + columns[inside]
+        i = np.searchsorted(self.keys, keys)
+        i = i[self.keys[np.minimum(i, len(self.keys) - 1)] == keys]
+        if len(i) == 1:
+            return self.order[self.cell_starts[i[0]]:self.cell_starts[i[0] + 1]]
+        # the concatenated ranges cell_starts[i] until cell_starts[i + 1] of self.order
+        starts, counts = self.cell_starts[i], self.cell_starts[i + 1] - self.cell_starts[i]
+        ends = np.cumsum(counts)
+        return self.order[np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - ends + counts, counts)]
@@ -0,0 +1,109 @@
+from math import inf, sqrt
+from typing import Optional
+
+import numpy as np
+
+from .geometry import length
+from ...linear_math import Transform
+
+
+class RangeMinimum:
+    """Sparse table that finds the first minimum in ranges of a fixed array, in constant time per range."""
+
+    def __init__(self, values: np.ndarray):
+        self.values = np.asarray(values, dtype=float)
+        self.levels = [np.arange(len(self.values))]
+        k = 1
+        while 2 * k <= len(self.values):
+            previous = self.levels[-1]
+            left, right = previous[:-k], previous[k:]
+            self.levels.append(np.where(self.values[right] < self.values[left], right, left))
+            k *= 2
+
+    def argmin(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """Index of the first minimum in values[start:end] for every start and end; no range may be empty."""
+        starts, ends = np.asarray(starts), np.asarray(ends)
+        # floor(log2(length)), exact for integers
+        levels = np.frexp(ends - starts)[1] - 1
+        left = np.empty_like(starts)
+        right = np.empty_like(starts)
+        for level in np.unique(levels):
+            at = levels == level
+            left[at] = self.levels[level][starts[at]]
+            right[at] = self.levels[level][ends[at] - (1 << int(level))]
+        return np.where(self.values[right] < self.values[left], right, left)
+
+
+class SpeedProfile:
+    """Highest speed at every point of a closed path for which the car can still brake for every point ahead.
+
+    `limits` are the speeds allowed at the points themselves, like TrackGeometry.target_speeds; inf on a straight
+    line. The backward pass lowers every point to sqrt(limits[k] ** 2 + 2 * deceleration * distance) for every point k
+    up to a lap ahead, or for the `window` points from the point itself, like the waypoint bots' old per-frame loop.
+    A forward pass with a finite `acceleration` lowers it to what the car can reach when accelerating from the points
+    behind. Both passes are a running minimum over the path unrolled twice, so they take the whole loop into account
+    no matter where it starts; a window is a range minimum instead. Only the first lap of the unrolled arrays is kept.
+    The profile is computed once per bot init; the per-frame lookups are constant time.
+    """
+
+    def __init__(self, points: np.ndarray, limits: np.ndarray, deceleration: float, acceleration: float = inf,
+                 segment_lengths: Optional[np.ndarray] = None, window: Optional[int] = None):
+        points = np.asarray(points, dtype=float)
+        self.n = n = len(points)
+        self.points = points
+        self.deceleration = deceleration
+        self.acceleration = acceleration
+
+        # arc_length[i] is the distance along the path from point 0 to point i of the path unrolled twice
+        # the distance from point i - 1 to point i, like TrackGeometry.segment_lengths for the waypoints
+        if segment_lengths is None:
+            segment_lengths = length(points - np.roll(points, 1, axis=0))
+        arc_length = np.concatenate([[0.], np.cumsum(np.tile(segment_lengths, 2)[1:])])
+        self.length = arc_length[n]
+        squared = np.tile(np.asarray(limits, dtype=float), 2) ** 2
+
+        # backward pass: min over k >= i of squared[k] + 2 * deceleration * (arc_length[k] - arc_length[i]), and the
+        # first k where it is reached
+        if window is None or window >= n:
+            values = (squared + 2 * deceleration * arc_length)[::-1]
+            minimum = np.minimum.accumulate(values)
+            last = np.maximum.accumulate(np.where(values <= minimum, np.arange(2 * n), 0))
+            squared = (minimum[::-1] - 2 * deceleration * arc_length)[:n]
+            self.limit = ((2 * n - 1 - last[::-1][:n]) % n).astype(np.int32)
+        else:
+            # the same minimum over k < i + window
+            starts = np.arange(n)
+            limit = RangeMinimum(squared + 2 * deceleration * arc_length).argmin(starts, starts + window)
+            squared = squared[limit] + 2 * deceleration * (arc_length[limit] - arc_length[:n])
+            self.limit = (limit % n).astype(np.int32)
+
+        # forward pass: min over k <= i of squared[k] + 2 * acceleration * (arc_length[i] - arc_length[k])
+        if acceleration < inf:
+            values = np.tile(squared, 2) - 2 * acceleration * arc_length
+            squared = (np.minimum.accumulate(values) + 2 * acceleration * arc_length)[n:]
+
+        self.squared = np.maximum(squared, 0.)
+        # up to point 0 at the end of the lap, as a copy so that the unrolled table can be freed
+        self.arc_length = arc_length[:n + 1].copy()
+
+    @property
+    def speeds(self) -> np.ndarray:
+        return np.sqrt(self.squared)
+
+    def braking_speed(self, i: int, distance: float) -> float:
+        """Highest speed at `distance` before point i that still allows to follow the profile."""
+        return sqrt(self.squared[i % self.n] + 2 * self.deceleration * distance)
+
+    def speed_at(self, s: float) -> float:
+        """Profile speed at arc length s (from point 0) between the points."""
+        s %= self.length
+        k = max(1, int(np.searchsorted(self.arc_length, s)))
+        squared = self.squared[k % self.n] + 2 * self.deceleration * (self.arc_length[k] - s)
+        if self.acceleration < inf:
+            squared = min(squared, self.squared[k - 1] + 2 * self.acceleration * (s - self.arc_length[k - 1]))
+        return sqrt(squared)
+
+    def __call__(self, position: Transform, next_waypoint: int) -> float:
+        """Target speed of a car at `position` that is driving towards point next_waypoint."""
+        x, y = self.points[next_waypoint]
+        return self.braking_speed(next_waypoint, sqrt((x - position.p.x) ** 2 + (y - position.p.y) ** 2))
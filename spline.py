@@ -0,0 +1,113 @@
+from typing import Tuple
+
+import numpy as np
+
+
+class CatmullRomSpline:
+    """Catmull-Rom spline through a closed ring of points, evaluated for many segments at once.
+
+    Segment i runs from points[i] to points[i + 1]. alpha = 0.5 gives the centripetal and alpha = 1.0 the chordal
+    variant.
+    """
+
+    def __init__(self, points: np.ndarray, alpha: float = 0.5):
+        self.p1 = np.asarray(points, dtype=float)
+        self.p0 = np.roll(self.p1, 1, axis=0)
+        self.p2 = np.roll(self.p1, -1, axis=0)
+        self.p3 = np.roll(self.p1, -2, axis=0)
+
+        self.t0 = np.zeros(len(self.p1))
+        self.t1 = self.t0 + np.linalg.norm(self.p1 - self.p0, axis=1) ** alpha
+        self.t2 = self.t1 + np.linalg.norm(self.p2 - self.p1, axis=1) ** alpha
+        self.t3 = self.t2 + np.linalg.norm(self.p3 - self.p2, axis=1) ** alpha
+
+    def __len__(self):
+        return len(self.p1)
+
+    def evaluate(self, segments: np.ndarray, t: np.ndarray) -> np.ndarray:
+        """Points at progress t (0 to 1) along the given segments, shape (len(t), 2)."""
+        t0, t1, t2, t3 = (k[segments, np.newaxis] for k in (self.t0, self.t1, self.t2, self.t3))
+        p0, p1, p2, p3 = (p[segments] for p in (self.p0, self.p1, self.p2, self.p3))
+
+        t = np.asarray(t, dtype=float)[:, np.newaxis] * (t2 - t1) + t1
+        a1 = (t1 - t) / (t1 - t0) * p0 + (t - t0) / (t1 - t0) * p1
+        a2 = (t2 - t) / (t2 - t1) * p1 + (t - t1) / (t2 - t1) * p2
+        a3 = (t3 - t) / (t3 - t2) * p2 + (t - t2) / (t3 - t2) * p3
+        b1 = (t2 - t) / (t2 - t0) * a1 + (t - t0) / (t2 - t0) * a2
+        b2 = (t3 - t) / (t3 - t1) * a2 + (t - t1) / (t3 - t1) * a3
+
+        return (t2 - t) / (t2 - t1) * b1 + (t - t1) / (t2 - t1) * b2
+
+    def sample(self, max_distance: float, endpoint: bool = True, min_points: int = 4, max_points: int = 512,
+               resolution: int = 32) -> Tuple[np.ndarray, np.ndarray]:
+        """Sample every segment at equal arc length steps shorter than max_distance.
+
+        The arc length is measured once on a polyline of `resolution` steps per segment, which is also used to map
+        arc length back to spline progress. With endpoint=True every segment includes its last point, which is then
+        the same as the first point of the next segment. Returns the points and the index of the first point of every
+        segment, followed by the number of points.
+        """
+        n = len(self)
+        segments = np.arange(n)
+
+        # arc length table of all segments, parameterized by segment + progress
+        progress = np.linspace(0, 1, resolution + 1)
+        table = self.evaluate(np.repeat(segments, resolution + 1), np.tile(progress, n)).reshape(n, resolution + 1, 2)
+        steps = np.linalg.norm(np.diff(table, axis=1), axis=2)
+        lengths = steps.sum(axis=1)
+        offsets = np.concatenate([[0.], np.cumsum(lengths)])
+        arc = (offsets[:-1, np.newaxis] + np.concatenate([np.zeros((n, 1)), np.cumsum(steps, axis=1)], axis=1))
+        parameter = segments[:, np.newaxis] + progress
+
+        # number of steps per segment
+        extra = 1 if endpoint else 0
+        counts = np.floor(lengths / max_distance).astype(int) + 1
+        counts = np.clip(counts, min_points - extra, max_points - extra)
+        starts = np.concatenate([[0], np.cumsum(counts + extra)])
+
+        sample_segments = np.repeat(segments, counts + extra)
+        step = np.arange(starts[-1]) - starts[sample_segments]
+        s = offsets[sample_segments] + lengths[sample_segments] * step / counts[sample_segments]
+        t = np.clip(np.interp(s, arc.ravel(), parameter.ravel()) - sample_segments, 0, 1)
+
+        return self.evaluate(sample_segments, t), starts
+
+
+class ArcLengthPath:
+    """Closed polyline with a table of the distance along it, to find the point at a distance ahead of a sample.
+
+    The points are kept as they are passed in, without a copy, and distances past the end of the lap wrap around to
+    its start.
+    """
+
+    def __init__(self, points: np.ndarray):
+        self.points = np.asarray(points, dtype=float)
+        self.n = len(self.points)
+        # arc_length[n] is the length of the closed path, back at point 0
+        closed = np.concatenate([self.points, self.points[:1]])
+        self.arc_length = np.concatenate([[0.], np.cumsum(np.linalg.norm(np.diff(closed, axis=0), axis=1))])
+        self.length = self.arc_length[self.n]
+
+    def point_at(self, start: int, distance: float) -> Tuple[np.ndarray, int]:
+        """Interpolated point `distance` (at most one lap) along the path after sample start, and the index of the
+        first sample at or beyond that point."""
+        if distance <= 0:
+            return self.points[start], start
+        s = self.arc_length[start] + min(distance, self.length)
+        if s > self.length:
+            s -= self.length
+        k = max(int(np.searchsorted(self.arc_length, s)), 1)
+        f = (s - self.arc_length[k - 1]) / (self.arc_length[k] - self.arc_length[k - 1])
+        a, b = self.points[k - 1], self.points[k % self.n]
+        return a + f * (b - a), k % self.n
+
+    def points_at(self, starts: np.ndarray, distances: np.ndarray) -> np.ndarray:
+        """point_at for arrays of starts and distances, shape (len(starts), 2)."""
+        starts = np.asarray(starts)
+        s = self.arc_length[starts] + np.minimum(distances, self.length)
+        s = np.where(s > self.length, s - self.length, s)
+        k = np.maximum(np.searchsorted(self.arc_length, s), 1)
+        f = (s - self.arc_length[k - 1]) / (self.arc_length[k] - self.arc_length[k - 1])
+        a, b = self.points[k - 1], self.points[k % self.n]
+        points = a + f[:, np.newaxis] * (b - a)
+        return np.where((distances <= 0)[:, np.newaxis], self.points[starts], points)
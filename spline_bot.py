@@ -1,48 +1,23 @@
 from argparse import Namespace
 from typing import Tuple
 
-import numpy as np
 import pygame
 from pygame import Vector2, Color
 
-from .utils import calculate_target_speeds, crange, calculate_target_speed
+from .cache import cached
+from .geometry import TrackGeometry
+from .instrumentation import instrumentation
+from .overlay import Overlay
+from .spatial import PointIndex
+from .speed_profile import SpeedProfile
+from .spline import CatmullRomSpline, ArcLengthPath
+from .utils import needs_init
 from ...bot import Bot
 from ...linear_math import Transform
 
 DEBUG = False
 
 
-class CatmullRomSpline:
-    def __init__(self, p0, p1, p2, p3, alpha: float = 0.5):
-        self.p0 = p0
-        self.p1 = p1
-        self.p2 = p2
-        self.p3 = p3
-        self.alpha = alpha
-
-        self.t0 = 0
-        self.t1 = self.get_t(self.t0, p0, p1)
-        self.t2 = self.get_t(self.t1, p1, p2)
-        self.t3 = self.get_t(self.t2, p2, p3)
-
-    def get_t(self, ti, pi, pj):
-        xi, yi = pi
-        xj, yj = pj
-        dx, dy = xj - xi, yj - yi
-        l = (dx ** 2 + dy ** 2) ** 0.5
-        return ti + l ** self.alpha
-
-    def progress(self, t):
-        t = t * (self.t2 - self.t1) + self.t1
-        a1 = (self.t1 - t) / (self.t1 - self.t0) * self.p0 + (t - self.t0) / (self.t1 - self.t0) * self.p1
-        a2 = (self.t2 - t) / (self.t2 - self.t1) * self.p1 + (t - self.t1) / (self.t2 - self.t1) * self.p2
-        a3 = (self.t3 - t) / (self.t3 - self.t2) * self.p2 + (t - self.t2) / (self.t3 - self.t2) * self.p3
-        b1 = (self.t2 - t) / (self.t2 - self.t0) * a1 + (t - self.t0) / (self.t2 - self.t0) * a2
-        b2 = (self.t3 - t) / (self.t3 - self.t1) * a2 + (t - self.t1) / (self.t3 - self.t1) * a3
-
-        return (self.t2 - t) / (self.t2 - self.t1) * b1 + (t - self.t1) / (self.t2 - self.t1) * b2
-
-
 class RoadSprinter(Bot):
     def __init__(self, track):
         super().__init__(track)
@@ -50,32 +25,38 @@ class RoadSprinter(Bot):
             deceleration=113.0881357782804,
             corner_slow_down=1.498228120897416,
             alpha=1.0,
-            lookahead=54.47393828538373,
-            min_segment_length=20.0
+            # arc length along the spline from the closest point
+            lookahead=56.1,
+            lookahead_time=0.0,
+            min_segment_length=20.0,
+            # the car brakes for the waypoints until speed_window waypoints ahead
+            speed_window=10,
         )
-        self.init()
+        self.initialized = False
 
     def init(self):
-        self.target_speeds = calculate_target_speeds(self.track, self.config.corner_slow_down)
-
-        splines = []
-        for i in range(len(self.track.lines)):
-            p0 = self.track.lines[(i - 1) % len(self.track.lines)]
-            p1 = self.track.lines[i]
-            p2 = self.track.lines[(i + 1) % len(self.track.lines)]
-            p3 = self.track.lines[(i + 2) % len(self.track.lines)]
-            splines.append(CatmullRomSpline(p0, p1, p2, p3, self.config.alpha))
-
-        # interpolate each spline
-        self.points = []
-        for spline in splines:
-            for n in (2 ** i for i in range(2, 10)):
-                points = [spline.progress(t) for t in np.linspace(0, 1, n)]
-                points = [Vector2(*p) for p in points]
-                longest_segment = max((points[i] - points[i - 1]).length() for i in range(1, len(points)))
-                if longest_segment < self.config.min_segment_length:
-                    break
-            self.points.append(points)
+        self.geometry = TrackGeometry.of(self.track)
+        self.target_speeds = self.geometry.target_speeds(self.config.corner_slow_down)
+        self.speed_profile = SpeedProfile(self.geometry.points, self.target_speeds, self.config.deceleration,
+                                          segment_lengths=self.geometry.segment_lengths,
+                                          window=self.config.speed_window)
+
+        data = cached('road_sprinter', self.track, self.sample_splines, alpha=self.config.alpha,
+                      min_segment_length=self.config.min_segment_length)
+        # all samples in one (n, 2) array, segment i from segment_starts[i] until segment_starts[i + 1]; the index,
+        # the path and the debug drawing all use it without a copy
+        self.points = data['points']
+        self.segment_starts = data['starts']
+        self.point_index = PointIndex(self.points)
+        self.path = ArcLengthPath(self.points)
+        self.closest_index = None
+        self.overlay = Overlay(self.draw_overlay)
+        self.initialized = True
+
+    def sample_splines(self):
+        spline = CatmullRomSpline(self.geometry.points, self.config.alpha)
+        points, starts = spline.sample(self.config.min_segment_length, endpoint=True)
+        return {'points': points, 'starts': starts}
 
     @property
     def name(self):
@@ -89,13 +70,18 @@ class RoadSprinter(Bot):
     def color(self):
         return Color(200, 200, 0)
 
+    @instrumentation.timed('compute_commands')
+    @needs_init
     def compute_commands(self, next_waypoint: int, position: Transform, velocity: Vector2) -> Tuple:
-        # first search for the closest point on the spline to the car
-        points = self.points[(next_waypoint - 1) % len(self.points)]
-        closest = min(range(len(points)), key=lambda i: (points[i] - position.p).length())
-
-        i, j = self.find_lookahead(next_waypoint, closest)
-        lookahead_point = self.points[i][j]
+        # the closest point of the current segment, or of the spline behind it when the car is far off it
+        segment = (next_waypoint - 1) % (len(self.segment_starts) - 1)
+        with instrumentation.phase(self, 'closest'):
+            start, end = self.segment_starts[segment], self.segment_starts[segment + 1]
+            self.closest_index = self.point_index.nearest_along(position.p, self.closest_index, start, end,
+                                                                self.track.track_width)
+
+        with instrumentation.phase(self, 'lookahead'):
+            lookahead_point = self.find_lookahead(self.closest_index, velocity.length())
         target = position.inverse() * lookahead_point
         try:
             gamma = 2 * target.y / target.length_squared()
@@ -103,41 +89,34 @@ class RoadSprinter(Bot):
             gamma = 0
         angular_velocity = gamma * velocity.length()
 
-        target_speed = calculate_target_speed(self.track, position, next_waypoint, self.target_speeds,
-                                              self.config.deceleration)
+        with instrumentation.phase(self, 'target_speed'):
+            target_speed = self.speed_profile(position, next_waypoint)
         if target_speed < velocity.length():
             throttle = -1
         else:
             throttle = 1
 
         # debug drawing
-        self.closest = points[closest]
-        self.lookahead = self.points[i][j]
+        self.closest = self.points[self.closest_index]
+        self.lookahead = lookahead_point
 
         return throttle, angular_velocity
 
-    def find_lookahead(self, next_waypoint: int, closest: int) -> Tuple[int, int]:
-        closest_point = self.points[(next_waypoint - 1) % len(self.points)][closest]
-        for i in crange(next_waypoint - 1, next_waypoint - 1 + len(self.track.lines), len(self.track.lines)):
-            if i == (next_waypoint - 1) % len(self.track.lines):
-                start_index = closest
-            else:
-                start_index = 0
-
-            for j in range(start_index, len(self.points[i])):
-                distance = (self.points[i][j] - closest_point).length()
-                if distance > self.config.lookahead:
-                    return i, j
-
-        raise RuntimeError('Could not find lookahead')
+    def find_lookahead(self, closest: int, speed: float) -> Vector2:
+        """The point on the spline that is lookahead + lookahead_time * speed further along than the closest point."""
+        point, _ = self.path.point_at(closest, self.config.lookahead + self.config.lookahead_time * speed)
+        return Vector2(*point)
 
+    @instrumentation.timed('draw')
+    @needs_init
     def draw(self, map_scaled, zoom):
         if not DEBUG:
             return
 
-        for segment in self.points:
-            for p in segment:
-                pygame.draw.circle(map_scaled, (0, 0, 0), p * zoom, 2)
-
+        self.overlay.draw(map_scaled, zoom)
         pygame.draw.circle(map_scaled, (200, 0, 0), self.closest * zoom, 5)
         pygame.draw.circle(map_scaled, (0, 200, 0), self.lookahead * zoom, 5)
+
+    def draw_overlay(self, surface, zoom):
+        for p in self.points * zoom:
+            pygame.draw.circle(surface, (0, 0, 0), p, 2)
@@ -1,57 +1,24 @@
 from argparse import Namespace
-from math import sqrt
-from typing import Tuple, Iterable
+from typing import Tuple
 
 import numpy as np
 import pygame
 from pygame import Vector2, Color
 
-from .utils import calculate_radius
+from .cache import cached
+from .geometry import TrackGeometry, calculate_radii
+from .instrumentation import instrumentation
+from .overlay import Overlay
+from .spatial import PointIndex
+from .speed_profile import RangeMinimum
+from .spline import CatmullRomSpline, ArcLengthPath
+from .utils import needs_init
 from ...bot import Bot
 from ...linear_math import Transform
 
 DEBUG = False
 
 
-def crange(start, end, length) -> Iterable[int]:
-    if start < end:
-        yield from range(start, end)
-    else:
-        yield from range(start, length)
-        yield from range(0, end)
-
-
-class CatmullRomSpline:
-    def __init__(self, p0, p1, p2, p3, alpha: float = 0.5):
-        self.p0 = p0
-        self.p1 = p1
-        self.p2 = p2
-        self.p3 = p3
-        self.alpha = alpha
-
-        self.t0 = 0
-        self.t1 = self.get_t(self.t0, p0, p1)
-        self.t2 = self.get_t(self.t1, p1, p2)
-        self.t3 = self.get_t(self.t2, p2, p3)
-
-    def get_t(self, ti, pi, pj):
-        xi, yi = pi
-        xj, yj = pj
-        dx, dy = xj - xi, yj - yi
-        l = (dx ** 2 + dy ** 2) ** 0.5
-        return ti + l ** self.alpha
-
-    def progress(self, t):
-        t = t * (self.t2 - self.t1) + self.t1
-        a1 = (self.t1 - t) / (self.t1 - self.t0) * self.p0 + (t - self.t0) / (self.t1 - self.t0) * self.p1
-        a2 = (self.t2 - t) / (self.t2 - self.t1) * self.p1 + (t - self.t1) / (self.t2 - self.t1) * self.p2
-        a3 = (self.t3 - t) / (self.t3 - self.t2) * self.p2 + (t - self.t2) / (self.t3 - self.t2) * self.p3
-        b1 = (self.t2 - t) / (self.t2 - self.t0) * a1 + (t - self.t0) / (self.t2 - self.t0) * a2
-        b2 = (self.t3 - t) / (self.t3 - self.t1) * a2 + (t - self.t1) / (self.t3 - self.t1) * a3
-
-        return (self.t2 - t) / (self.t2 - self.t1) * b1 + (t - self.t1) / (self.t2 - self.t1) * b2
-
-
 class RoadSprinter(Bot):
     def __init__(self, track):
         super().__init__(track)
@@ -59,44 +26,46 @@ class RoadSprinter(Bot):
             deceleration=100.0,
             corner_slow_down=2.0,
             alpha=1.0,
-            lookahead=55.0,
+            # arc length along the spline from the closest point
+            lookahead=58.9,
+            lookahead_time=0.0,
+            # the car brakes for the points from speed_lookahead (arc length) until speed_window points ahead
             speed_lookahead=100,
+            speed_window=100,
             min_segment_length=20.0
         )
-        self.points = []
-        self.spline_starts = []
-        self.target_speeds = []
-        self.init()
+        self.points = np.empty((0, 2))
+        self.spline_starts = np.empty(0, dtype=int)
+        self.target_speeds = np.empty(0)
+        self.braking_speeds = np.empty(0)
+        self.corners = np.empty(0, dtype=int)
+        self.initialized = False
 
     def init(self):
-        splines = []
-        for i in range(len(self.track.lines)):
-            p0 = self.track.lines[(i - 1) % len(self.track.lines)]
-            p1 = self.track.lines[i]
-            p2 = self.track.lines[(i + 1) % len(self.track.lines)]
-            p3 = self.track.lines[(i + 2) % len(self.track.lines)]
-            splines.append(CatmullRomSpline(p0, p1, p2, p3, self.config.alpha))
-
-        # interpolate each spline
-        self.points = []
-        self.spline_starts = []
-        for spline in splines:
-            for n in (2 ** i for i in range(2, 10)):
-                points = [spline.progress(t) for t in np.linspace(0, 1, n, endpoint=False)]
-                points = [Vector2(*p) for p in points]
-                longest_segment = max((points[i] - points[i - 1]).length() for i in range(1, len(points)))
-                if longest_segment < self.config.min_segment_length:
-                    break
-            self.spline_starts.append(len(self.points))
-            self.points.extend(points)
-
-        for i in range(len(self.points)):
-            p0 = self.points[(i - 1) % len(self.points)]
-            p1 = self.points[i]
-            p2 = self.points[(i + 1) % len(self.points)]
-            R = calculate_radius(p0, p1, p2)
-            target_speed = self.config.corner_slow_down * R
-            self.target_speeds.append(target_speed)
+        self.geometry = TrackGeometry.of(self.track)
+        data = cached('road_sprinter2', self.track, self.sample_splines, alpha=self.config.alpha,
+                      min_segment_length=self.config.min_segment_length,
+                      corner_slow_down=self.config.corner_slow_down)
+        # (n, 2) array shared without a copy by the index, the path and the debug drawing
+        self.points = data['points']
+        self.spline_starts = data['spline_starts']
+        self.target_speeds = data['target_speeds']
+
+        self.point_index = PointIndex(self.points)
+        self.path = ArcLengthPath(self.points)
+        self.braking_speeds, self.corners = self.braking_limits()
+        self.closest_index = None
+        self.overlay = Overlay(self.draw_overlay)
+        self.initialized = True
+
+    def sample_splines(self):
+        spline = CatmullRomSpline(self.geometry.points, self.config.alpha)
+        points, starts = spline.sample(self.config.min_segment_length, endpoint=False)
+        return {
+            'points': points,
+            'spline_starts': starts[:-1],
+            'target_speeds': self.config.corner_slow_down * calculate_radii(points),
+        }
 
     @property
     def name(self):
@@ -110,16 +79,20 @@ class RoadSprinter(Bot):
     def color(self):
         return Color(200, 0, 0)
 
+    @instrumentation.timed('compute_commands')
+    @needs_init
     def compute_commands(self, next_waypoint: int, position: Transform, velocity: Vector2) -> Tuple:
-        # first search for the closest point on the spline to the car
+        # the closest point of the current segment, or of the spline behind it when the car is far off it
         search_start = self.spline_starts[(next_waypoint - 1) % len(self.track.lines)]
         search_end = self.spline_starts[next_waypoint]
 
-        closest = min(crange(search_start, search_end, len(self.points)),
-                      key=lambda i: (self.points[i] - position.p).length())
+        with instrumentation.phase(self, 'closest'):
+            closest = self.point_index.nearest_along(position.p, self.closest_index, search_start, search_end,
+                                                     self.track.track_width)
+        self.closest_index = closest
 
-        i = self.find_lookahead(position, closest)
-        lookahead_point = self.points[i]
+        with instrumentation.phase(self, 'lookahead'):
+            lookahead_point = self.find_lookahead(closest, velocity.length())
         target = position.inverse() * lookahead_point
         try:
             gamma = 2 * target.y / target.length_squared()
@@ -127,25 +100,8 @@ class RoadSprinter(Bot):
             gamma = 0
         angular_velocity = gamma * velocity.length()
 
-        # print()
-        # print(f'{"i":>3} {"dist":>7} {"target":>7} {"max":>8}')
-        distance = 0
-        min_speed = float('inf')
-        corner_index = 0
-        for i in crange(closest, (closest + 100) % len(self.points), len(self.points)):
-            distance += (self.points[i] - self.points[(i - 1) % len(self.points)]).length()
-            if distance < self.config.speed_lookahead:
-                continue
-            target_speed = self.target_speeds[i]
-            max_speed = sqrt(target_speed ** 2 + 2 * self.config.deceleration * distance)
-            if max_speed < min_speed:
-                # print(f'{i:3} {distance:7.2f} {target_speed:7.2f} {max_speed:8.2f} *')
-                min_speed = max_speed
-                corner_index = i
-            # else:
-            # print(f'{i:3} {distance:7.2f} {target_speed:7.2f} {max_speed:8.2f}')
-
-        target_speed = min_speed
+        with instrumentation.phase(self, 'target_speed'):
+            target_speed, corner_index = self.braking_limit(closest)
 
         if target_speed < velocity.length():
             throttle = -1
@@ -159,25 +115,53 @@ class RoadSprinter(Bot):
 
         return throttle, 3 * angular_velocity
 
-    def find_lookahead(self, position: Transform, closest: int) -> int:
-        for i in crange(closest, (closest + len(self.points)) % len(self.points), len(self.points)):
-            distance = (self.points[i] - position.p).length()
-            if distance > self.config.lookahead:
-                return i
-
-        raise RuntimeError('Could not find lookahead')
-
+    def braking_limits(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Lowest speed from which the car can still brake for every point from speed_lookahead until speed_window
+        points ahead, and the point that sets it, for every closest point.
+
+        The speed for point k is sqrt(target_speeds[k] ** 2 + 2 * deceleration * (arc_length[k] - before)), so the
+        lowest one is at the range minimum of target_speeds ** 2 + 2 * deceleration * arc_length over the path unrolled
+        twice. The range starts at the first point that is speed_lookahead away.
+        """
+        n, arc_length, lap = len(self.points), self.path.arc_length, self.path.length
+        unrolled = np.concatenate([arc_length[:n], arc_length[:n] + lap])
+        squared = np.tile(self.target_speeds, 2) ** 2
+        closest = np.arange(n)
+        # the distance to every point is counted from the point before the closest one
+        before = np.concatenate([[arc_length[n - 1] - lap], arc_length[:n - 1]])
+        starts = np.maximum(np.searchsorted(unrolled, before + self.config.speed_lookahead), closest)
+        ends = closest + min(self.config.speed_window, n)
+        empty = starts >= ends
+
+        corners = RangeMinimum(squared + 2 * self.config.deceleration * unrolled).argmin(np.minimum(starts, ends - 1),
+                                                                                          ends)
+        speeds = np.sqrt(squared[corners] + 2 * self.config.deceleration * (unrolled[corners] - before))
+        speeds[empty] = np.inf
+        corners[speeds == np.inf] = 0
+        return speeds, corners % n
+
+    def braking_limit(self, closest: int) -> Tuple[float, int]:
+        """Lowest speed from which the car can still brake for every point from speed_lookahead until speed_window
+        points ahead of the closest point, and the point that sets it."""
+        return float(self.braking_speeds[closest]), int(self.corners[closest])
+
+    def find_lookahead(self, closest: int, speed: float) -> Vector2:
+        """The point on the spline that is lookahead + lookahead_time * speed further along than the closest point."""
+        point, _ = self.path.point_at(closest, self.config.lookahead + self.config.lookahead_time * speed)
+        return Vector2(*point)
+
+    @instrumentation.timed('draw')
+    @needs_init
     def draw(self, map_scaled, zoom):
         if not DEBUG:
             return
 
-        for i in range(len(self.points)):
-            p = self.points[i]
-            target_speed = self.target_speeds[i]
-            target_speed = target_speed / 5 / self.config.corner_slow_down
-            color = (0 if target_speed > 255 else 255 - target_speed, 0, 255 if target_speed > 255 else target_speed)
-            pygame.draw.circle(map_scaled, color, p * zoom, 2)
-
+        self.overlay.draw(map_scaled, zoom)
         pygame.draw.circle(map_scaled, (200, 0, 0), self.closest * zoom, 5)
         pygame.draw.circle(map_scaled, (0, 200, 0), self.lookahead * zoom, 5)
         pygame.draw.circle(map_scaled, (0, 0, 200), self.corner * zoom, 5)
+
+    def draw_overlay(self, surface, zoom):
+        for p, target_speed in zip(self.points * zoom, self.target_speeds / 5 / self.config.corner_slow_down):
+            color = (0 if target_speed > 255 else 255 - target_speed, 0, 255 if target_speed > 255 else target_speed)
+            pygame.draw.circle(surface, color, p, 2)
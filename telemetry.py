@@ -0,0 +1,283 @@
+import atexit
+import os
+import struct
+from argparse import ArgumentParser
+from socket import socket, AF_INET, SOCK_DGRAM
+from threading import Event, Lock, Thread
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+DEFAULT_ADDRESS = ('127.0.0.1', 12389)
+
+# Packet layout: header (magic, kind, channel id, count) followed by the payload. A schema packet carries the tab
+# separated channel name and field names, a data packet `count` raw records. A dropped packet has no payload; its
+# count is the number of records the channel dropped so far.
+MAGIC = b'RTLM'
+HEADER = struct.Struct('<4sBHI')
+SCHEMA, DATA, DROPPED = 0, 1, 2
+MAX_PACKET = 60000
+# records in a file are prefixed with the packet length
+LENGTH = struct.Struct('<I')
+
+
+def record_dtype(fields: Sequence[str]) -> np.dtype:
+    return np.dtype([('time', '<f8')] + [(field, '<f8') for field in fields])
+
+
+class Channel:
+    """Preallocated ring buffer of fixed-layout records: the time followed by one float per field.
+
+    The bot writes with `record`, the flush thread reads with `take`. When the flush thread falls behind by more than
+    the capacity, the oldest records are overwritten and counted as dropped.
+    """
+    __slots__ = ('id', 'name', 'fields', 'dtype', 'buffer', 'written', 'taken', 'dropped')
+
+    def __init__(self, channel_id: int, name: str, fields: Sequence[str], capacity: int):
+        self.id = channel_id
+        self.name = name
+        self.fields = tuple(fields)
+        self.dtype = record_dtype(fields)
+        self.buffer = np.zeros(capacity, self.dtype)
+        self.written = 0
+        self.taken = 0
+        self.dropped = 0
+
+    def record(self, *values: float):
+        self.buffer[self.written % len(self.buffer)] = (perf_counter(), *values)
+        self.written += 1
+
+    def take(self) -> np.ndarray:
+        """Copy of the records written since the previous call, oldest first."""
+        capacity = len(self.buffer)
+        written = self.written
+        start = max(self.taken, written - capacity)
+        records = self.buffer[np.arange(start, written) % capacity]
+        # the bot may have wrapped around the buffer while it was copied
+        overwritten = min(max(0, self.written - capacity - start), len(records))
+        self.dropped += start - self.taken + overwritten
+        self.taken = written
+        return records[overwritten:]
+
+    def skip(self):
+        self.taken = self.written
+
+
+def encode(channel: Channel, records: np.ndarray) -> Iterator[bytes]:
+    """Packets of a batch of records, preceded by the schema so a receiver can join at any time, and followed by the
+    number of dropped records if the channel dropped any."""
+    yield (HEADER.pack(MAGIC, SCHEMA, channel.id, len(channel.fields)) +
+           '\t'.join((channel.name,) + channel.fields).encode('utf-8'))
+    per_packet = max(1, (MAX_PACKET - HEADER.size) // channel.dtype.itemsize)
+    for i in range(0, len(records), per_packet):
+        chunk = records[i:i + per_packet]
+        yield HEADER.pack(MAGIC, DATA, channel.id, len(chunk)) + chunk.tobytes()
+    if channel.dropped:
+        yield HEADER.pack(MAGIC, DROPPED, channel.id, channel.dropped)
+
+
+class UdpSink:
+    def __init__(self, address: Tuple[str, int]):
+        self.address = address
+        self.sock = socket(AF_INET, SOCK_DGRAM)
+
+    def write(self, packet: bytes):
+        try:
+            self.sock.sendto(packet, self.address)
+        except OSError:
+            # nobody is listening
+            pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.sock.close()
+
+
+class FileSink:
+    def __init__(self, path: str):
+        self.file = open(path, 'ab')
+
+    def write(self, packet: bytes):
+        self.file.write(LENGTH.pack(len(packet)) + packet)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def open_sink(target: Union[str, Tuple[str, int]]):
+    """UDP sink for an address or 'host:port', file sink for anything else."""
+    if isinstance(target, tuple):
+        return UdpSink(target)
+    host, _, port = target.rpartition(':')
+    if host and port.isdigit():
+        return UdpSink((host, int(port)))
+    return FileSink(target)
+
+
+class Telemetry:
+    """Runtime switchable telemetry of the bots.
+
+    Bots get a channel with a fixed set of fields once, and call `record` on it when `enabled` is set, so disabled
+    telemetry costs a single flag check. A background thread batches the records every `interval` seconds into UDP
+    packets or a file. Enable it with `enable()` or by setting RACER_TELEMETRY to 'host:port' or a file path.
+    """
+
+    def __init__(self, capacity: int = 4096, interval: float = 0.1):
+        self.enabled = False
+        self.capacity = capacity
+        self.interval = interval
+        self.channels: List[Channel] = []
+        self.sink = None
+        self._thread: Optional[Thread] = None
+        self._stop = Event()
+        self._lock = Lock()
+        self._close_registered = False
+
+    def channel(self, name: str, fields: Sequence[str]) -> Channel:
+        """The channel of that name, created on first use. Bots of the same name share a channel."""
+        for channel in self.channels:
+            if channel.name == name:
+                if channel.fields != tuple(fields):
+                    raise ValueError(f'Telemetry channel {name} already has fields {channel.fields}')
+                return channel
+        channel = Channel(len(self.channels), name, fields, self.capacity)
+        self.channels.append(channel)
+        return channel
+
+    def enable(self, target: Union[str, Tuple[str, int]] = DEFAULT_ADDRESS):
+        self.disable()
+        self.sink = open_sink(target)
+        for channel in self.channels:
+            channel.skip()
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name='telemetry', daemon=True)
+        self._thread.start()
+        self.enabled = True
+        if not self._close_registered:
+            atexit.register(self.disable)
+            self._close_registered = True
+
+    def disable(self):
+        """Stop recording and send what is left in the buffers."""
+        self.enabled = False
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self.sink is not None:
+            self.flush()
+            self.sink.close()
+            self.sink = None
+
+    def flush(self):
+        with self._lock:
+            for channel in self.channels:
+                dropped = channel.dropped
+                records = channel.take()
+                if len(records) or channel.dropped > dropped:
+                    for packet in encode(channel, records):
+                        self.sink.write(packet)
+            self.sink.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+
+class Recorder:
+    """Decodes telemetry packets and collects the records and the number of dropped records per channel name."""
+
+    def __init__(self):
+        self.schemas: Dict[int, Tuple[str, np.dtype]] = {}
+        self.chunks: Dict[str, List[np.ndarray]] = {}
+        self.dropped: Dict[str, int] = {}
+
+    @classmethod
+    def of(cls, path: str) -> 'Recorder':
+        """A recorder fed with all packets of a telemetry file."""
+        recorder = cls()
+        with open(path, 'rb') as f:
+            while True:
+                prefix = f.read(LENGTH.size)
+                if len(prefix) < LENGTH.size:
+                    break
+                recorder.feed(f.read(LENGTH.unpack(prefix)[0]))
+        return recorder
+
+    def feed(self, packet: bytes) -> Optional[Tuple[str, np.ndarray]]:
+        """Decode a packet; returns the channel name and records of a data packet."""
+        magic, kind, channel_id, count = HEADER.unpack_from(packet)
+        if magic != MAGIC:
+            raise ValueError('Not a telemetry packet')
+        payload = packet[HEADER.size:]
+        if kind == SCHEMA:
+            name, *fields = payload.decode('utf-8').split('\t')
+            self.schemas[channel_id] = name, record_dtype(fields)
+            return None
+        if channel_id not in self.schemas:
+            return None
+        name, dtype = self.schemas[channel_id]
+        if kind == DROPPED:
+            # the count is a running total, so a lost packet is made up for by the next one
+            self.dropped[name] = max(self.dropped.get(name, 0), count)
+            return None
+        records = np.frombuffer(payload, dtype, count)
+        self.chunks.setdefault(name, []).append(records)
+        return name, records
+
+    def records(self) -> Dict[str, np.ndarray]:
+        return {name: np.concatenate(chunks) for name, chunks in self.chunks.items()}
+
+
+def read(path: str) -> Dict[str, np.ndarray]:
+    """All records of a telemetry file per channel name."""
+    return Recorder.of(path).records()
+
+
+def listen(address: Tuple[str, int] = DEFAULT_ADDRESS, output: Optional[str] = None):
+    """Print the telemetry sent to an address until interrupted, then save all records to `output` (.npz)."""
+    recorder = Recorder()
+    sock = socket(AF_INET, SOCK_DGRAM)
+    sock.bind(address)
+    try:
+        while True:
+            decoded = recorder.feed(sock.recv(65536))
+            if decoded is not None:
+                name, records = decoded
+                last = records[-1]
+                print(name, ' '.join(f'{field}={last[field]:.3f}' for field in records.dtype.names), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        if output:
+            np.savez(output, **recorder.records())
+
+
+telemetry = Telemetry()
+if os.environ.get('RACER_TELEMETRY'):
+    telemetry.enable(os.environ['RACER_TELEMETRY'])
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Receive, print and record bot telemetry')
+    parser.add_argument('--host', default=DEFAULT_ADDRESS[0])
+    parser.add_argument('--port', type=int, default=DEFAULT_ADDRESS[1])
+    parser.add_argument('--output', help='save all records to this .npz file when stopped')
+    parser.add_argument('--read', help='decode a telemetry file instead of listening')
+    args = parser.parse_args()
+    if args.read:
+        recorder = Recorder.of(args.read)
+        channels = recorder.records()
+        for name, records in channels.items():
+            print(f'{name}: {len(records)} records of {", ".join(records.dtype.names)}, '
+                  f'{recorder.dropped.get(name, 0)} dropped')
+        if args.output:
+            np.savez(args.output, **channels)
+    else:
+        listen((args.host, args.port), args.output)
@@ -1,5 +1,28 @@
-from .bot import Dustrider
+from importlib import import_module
 
+import pytest
 
-def test_init():
-    bot = Dustrider(track=None)
+from . import BOTS
+from .benchmarks.tracks import synthetic_track
+from .headless import race, start_position
+from .recording import replay
+
+
+@pytest.mark.parametrize('name', BOTS)
+def test_init(name):
+    track = synthetic_track()
+    bot = getattr(import_module(__package__), name)(track)
+    assert not bot.initialized
+    position, velocity, next_waypoint = start_position(track)
+    throttle, steering_command = bot.compute_commands(next_waypoint, position, velocity)
+    assert bot.initialized
+    assert -1 <= throttle <= 1
+
+
+@pytest.mark.parametrize('name', BOTS)
+def test_replay(name, tmp_path):
+    bot_class = getattr(import_module(__package__), name)
+    track = synthetic_track()
+    race(bot_class, track, max_time=5., recording=str(tmp_path / 'race.rec'))
+    result = replay(bot_class, str(tmp_path / 'race.rec'), track)
+    assert len(result.differing_frames()) == 0
@@ -0,0 +1,58 @@
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from . import cache
+from .benchmarks.tracks import synthetic_track
+
+
+def build():
+    build.calls += 1
+    return {'values': np.arange(10.)}
+
+
+def test_round_trip():
+    track = synthetic_track(seed=1)
+    build.calls = 0
+    first = cache.cached('test', track, build, alpha=1.)
+    second = cache.cached('test', track, build, alpha=1.)
+    assert build.calls == 1
+    assert isinstance(second['values'], np.memmap) and not second['values'].flags.writeable
+    np.testing.assert_array_equal(first['values'], second['values'])
+
+    cache.cached('test', track, build, alpha=2.)
+    assert build.calls == 2
+
+
+def test_version(monkeypatch):
+    track = synthetic_track(seed=2)
+    build.calls = 0
+    cache.cached('test', track, build)
+    key, identity = cache.track_hash(track), cache.track_id(track)
+    monkeypatch.setattr(cache, 'CACHE_VERSION', cache.CACHE_VERSION + 1)
+    cache.cached('test', track, build)
+    assert build.calls == 2
+    assert cache.track_hash(track) != key
+    assert cache.track_id(track) == identity
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(cache, 'CACHE_DIR', '')
+    build.calls = 0
+    cache.cached('test', synthetic_track(seed=3), build)
+    cache.cached('test', synthetic_track(seed=3), build)
+    assert build.calls == 2
+
+
+def test_evict(tmp_path):
+    for i, age in enumerate([0, 10, 20, 3600]):
+        entry = tmp_path / f'entry-{i}'
+        entry.mkdir()
+        (entry / 'values.npy').write_bytes(b'x' * 100)
+        os.utime(entry, (time.time() - age, time.time() - age))
+    (tmp_path / '.entry-4').mkdir()
+
+    cache.evict(tmp_path, max_age=1000, max_size=250)
+    assert sorted(p.name for p in Path(tmp_path).iterdir()) == ['.entry-4', 'entry-0', 'entry-1']
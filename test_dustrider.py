@@ -0,0 +1,125 @@
+from time import perf_counter, sleep
+from typing import Tuple
+
+import numpy as np
+import pytest
+
+from .benchmarks.tracks import synthetic_track
+from .dustrider import Dustrider
+from .headless import race, start_position
+from ...constants import framerate
+
+
+def drive(planner: str, **config) -> Tuple[Dustrider, Tuple]:
+    """A Dustrider with the planner, and a state at speed past the start."""
+    track = synthetic_track()
+    bot = Dustrider(track)
+    bot.init()
+    position, velocity, next_waypoint = start_position(track)
+    velocity.x, velocity.y = 200 * position.M.cols[0]
+    position.p += 100 * position.M.cols[0]
+    vars(bot.config).update(planner=planner, **config)
+    return bot, (next_waypoint, position, velocity)
+
+
+def plan_cost(bot: Dustrider, state, commands: np.ndarray) -> float:
+    rollout = bot.get_rollout(1)
+    throttle, steering_command = np.broadcast_to(commands, (2, bot.config.n))
+    rollout.simulate(*state, throttle[np.newaxis], steering_command[np.newaxis], 1 / 60)
+    return float(rollout.cost(state[0], bot.config)[0])
+
+
+def test_tree_depth_one_is_grid():
+    bot, state = drive('grid')
+    grid = bot.search(*state)
+    bot.config.planner, bot.config.tree_depth = 'tree', 1
+    tree = bot.search(*state)
+    np.testing.assert_array_equal(tree[0][:, 0], grid[0][:, 0])
+    np.testing.assert_allclose(tree[1], grid[1])
+
+
+@pytest.mark.parametrize('depth', [2, 3])
+def test_tree_improves_on_grid(depth):
+    bot, state = drive('tree', tree_depth=depth)
+    commands, trajectory, _ = bot.search(*state)
+    assert commands.shape == (2, bot.config.n)
+    assert trajectory.shape == (bot.config.n + 1, 2)
+    cost = plan_cost(bot, state, commands)
+    # the trajectory is the one the commands drive
+    np.testing.assert_allclose(bot.get_rollout(1).trajectory[:, 0], trajectory)
+
+    bot.config.planner = 'grid'
+    grid, _, _ = bot.search(*state)
+    assert cost <= plan_cost(bot, state, grid)
+
+
+@pytest.mark.parametrize('planner', ['sampling', 'anytime'])
+def test_commands(planner):
+    bot, state = drive(planner)
+    bot.rng = np.random.default_rng(0)
+    for _ in range(3):
+        commands, trajectory, _ = bot.search(*state)
+        assert commands.ndim == 2 and commands.shape[0] == 2 and commands.shape[1] in (1, bot.config.n)
+        assert np.all(np.abs(commands) <= 1)
+        assert trajectory.shape == (bot.config.n + 1, 2)
+        np.testing.assert_array_equal(bot.previous_command, commands[:, 0])
+        # the trajectory is the one the commands drive
+        plan_cost(bot, state, commands)
+        np.testing.assert_allclose(bot.get_rollout(1).trajectory[:, 0], trajectory)
+
+
+def test_anytime_deadline():
+    bot, state = drive('anytime', budget=0.)
+    # without a budget only the first chunk runs, with a large one the whole grid
+    bot.search(*state)
+    assert bot.candidates_evaluated == bot.config.chunk
+    bot.config.budget = 1000.
+    bot.search(*state)
+    assert bot.candidates_evaluated == len(bot.anytime_grid()) + 1
+
+    bot.config.budget = 0.
+    chunk = min(timed(bot.search, *state) for _ in range(5))
+    bot.config.budget = 0.5
+    for _ in range(5):
+        # a chunk only starts when the slowest one so far can finish before the deadline
+        assert timed(bot.search, *state) < bot.config.budget / framerate + 2 * chunk + 1e-3
+
+
+def timed(function, *args) -> float:
+    start = perf_counter()
+    function(*args)
+    return perf_counter() - start
+
+
+@pytest.mark.parametrize('planner, config', [('sampling', {}), ('anytime', {'budget': 0.2})])
+def test_finishes(planner, config):
+    track = synthetic_track(12)
+    bot = Dustrider(track)
+    vars(bot.config).update(planner=planner, **config)
+    bot.rng = np.random.default_rng(0)
+    result = race(bot, track, max_time=60.)
+    assert result.finished
+    assert len(result.splits) == len(track.lines)
+
+
+class StalledDustrider(Dustrider):
+    """A Dustrider whose background planner never finishes a plan."""
+
+    def search(self, next_waypoint, position, velocity):
+        sleep(60)
+
+
+def test_background_never_waits():
+    bot, state = drive('grid', asynchronous=True)
+    bot = StalledDustrider(bot.track)
+    bot.config.asynchronous = True
+    bot.init()
+    try:
+        for _ in range(30):
+            start = perf_counter()
+            throttle, steering_command = bot.compute_commands(*state)
+            assert perf_counter() - start < 1 / framerate
+            assert throttle in (-1, 1) and np.isfinite(steering_command)
+            assert bot.background.latest() is None
+    finally:
+        bot.background.close()
@@ -0,0 +1,64 @@
+from copy import deepcopy
+
+import numpy as np
+import pytest
+from pygame import Vector2
+
+from .benchmarks.tracks import synthetic_track
+from .fleet import fleet_of, stack_inputs
+from .headless import start_position
+from .pid import PID
+from .pure_pursuit import PurePursuit
+from .spline_bot import RoadSprinter
+from ...car_info import CarPhysics
+
+
+def varied_bots(bot_class, track, size: int, rng: np.random.Generator):
+    bots = []
+    for _ in range(size):
+        bot = bot_class(track)
+        bot.config.deceleration *= rng.uniform(0.8, 1.2)
+        bot.config.corner_slow_down *= rng.uniform(0.8, 1.2)
+        if bot_class is PID:
+            bot.config.p *= rng.uniform(0.8, 1.2)
+        if bot_class is RoadSprinter:
+            bot.config.lookahead *= rng.uniform(0.8, 1.2)
+            bot.config.lookahead_time = rng.uniform(0, 0.2)
+        bots.append(bot)
+    return bots
+
+
+@pytest.mark.parametrize('bot_class', [PID, PurePursuit, RoadSprinter])
+def test_matches_bots(bot_class):
+    """A fleet and its bots, each with its own config, give the same commands over a race."""
+    track = synthetic_track(seed=5)
+    bots = varied_bots(bot_class, track, 6, np.random.default_rng(0))
+    fleet = fleet_of(bots)
+    cars = []
+    for _ in bots:
+        position, velocity, next_waypoint = start_position(track)
+        cars.append([CarPhysics(position, velocity), next_waypoint])
+
+    for _ in range(600):
+        inputs = [(next_waypoint, deepcopy(car.position), Vector2(car.velocity)) for car, next_waypoint in cars]
+        throttle, steering_command = fleet.compute_commands(*stack_inputs(inputs))
+        expected = np.array([bot.compute_commands(*args) for bot, args in zip(bots, inputs)], dtype=float)
+        np.testing.assert_array_equal(throttle, expected[:, 0])
+        np.testing.assert_allclose(steering_command, expected[:, 1], rtol=0, atol=1e-12)
+
+        for (car, next_waypoint), commands in zip(cars, expected):
+            car.update(1 / 60, *commands)
+        for state in cars:
+            car, next_waypoint = state
+            if (track.lines[next_waypoint] - car.position.p).length() < track.track_width:
+                state[1] = (next_waypoint + 1) % len(track.lines)
+    # the cars got around some corners
+    assert min(next_waypoint for _, next_waypoint in cars) > 5
+
+
+def test_rejects_mixed_bots():
+    track = synthetic_track()
+    with pytest.raises(ValueError):
+        fleet_of([PID(track), PurePursuit(track)])
+    with pytest.raises(ValueError):
+        fleet_of([PID(track), PID(synthetic_track(seed=1))])
@@ -0,0 +1,76 @@
+import pytest
+
+from .benchmarks.tracks import synthetic_track
+from .headless import race, start_position
+from .pid import PID
+from .recording import RaceRecorder, Recording
+from ...constants import framerate
+
+
+def test_splits(tmp_path):
+    track = synthetic_track(12)
+    n = len(track.lines)
+    result = race(PID, track, laps=2, recording=str(tmp_path / 'race.rec'))
+    frames = Recording(str(tmp_path / 'race.rec')).frames
+
+    assert result.finished
+    assert [(lap, waypoint) for lap, waypoint, _ in result.splits] == [(lap, i) for lap in range(2) for i in range(n)]
+    times = [time for _, _, time in result.splits]
+    assert times == sorted(times) and times[-1] == result.time == result.race_time
+    assert len(result.compute_times) == len(frames) == round(result.time * framerate)
+    # a lap ends at the split of its last waypoint
+    assert result.lap_times == pytest.approx([times[n - 1], times[2 * n - 1] - times[n - 1]])
+
+    # a waypoint is reached in the step that brings the car within track_width of it, so the next frame drives
+    # towards the next waypoint from there
+    for lap, waypoint, time in result.splits[:-1]:
+        step = round(time * framerate)
+        assert frames['next_waypoint'][step - 1] == waypoint
+        assert frames['next_waypoint'][step] == (waypoint + 1) % n
+        assert (track.lines[waypoint] - frames['position'][step]).length() < track.track_width
+
+
+def test_unfinished():
+    track = synthetic_track(12)
+    result = race(PID, track, laps=2, max_time=5.)
+    assert not result.finished and result.race_time == float('inf')
+    assert result.time == pytest.approx(5.)
+    assert len(result.compute_times) == 5 * framerate
+    assert 0 < len(result.splits) < len(track.lines) and not result.lap_times
+
+
+class Crash(Exception):
+    pass
+
+
+class CrashingPID(PID):
+    """A PID that raises in its 100th frame."""
+
+    def __init__(self, track):
+        super().__init__(track)
+        self.frames = 0
+
+    def compute_commands(self, next_waypoint, position, velocity):
+        self.frames += 1
+        if self.frames == 100:
+            raise Crash
+        return super().compute_commands(next_waypoint, position, velocity)
+
+
+def test_recording_crash(tmp_path):
+    """A bot that raises is unpatched, and the frames before are in the closed recording."""
+    track = synthetic_track(12)
+    bot = CrashingPID(track)
+    with pytest.raises(Crash):
+        race(bot, track, recording=str(tmp_path / 'race.rec'))
+    assert 'compute_commands' not in vars(bot)
+    assert len(Recording(str(tmp_path / 'race.rec'))) == 99
+
+    bot = CrashingPID(track)
+    position, velocity, next_waypoint = start_position(track)
+    with pytest.raises(Crash):
+        with RaceRecorder(str(tmp_path / 'with.rec'), bot) as recorder:
+            while True:
+                bot.compute_commands(next_waypoint, position, velocity)
+    assert recorder.file.closed and 'compute_commands' not in vars(bot)
+    assert len(Recording(str(tmp_path / 'with.rec'))) == 99
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from .instrumentation import N_BUCKETS, SUB_BUCKETS, LatencyHistogram, bucket_index, bucket_start
+
+
+def test_buckets():
+    assert [bucket_index(ns) for ns in range(2 * SUB_BUCKETS)] == list(range(2 * SUB_BUCKETS))
+    assert [bucket_start(i) for i in range(2 * SUB_BUCKETS)] == list(range(2 * SUB_BUCKETS))
+
+    values = list(range(100000)) + [int(x) for x in np.geomspace(1e5, 1e12, 10000)]
+    indices = [bucket_index(ns) for ns in values]
+    assert indices == sorted(indices)
+    for ns, i in zip(values, indices):
+        assert bucket_start(i) <= ns < bucket_start(i + 1)
+        # 8 buckets per power of two
+        assert bucket_start(i + 1) - bucket_start(i) <= max(1, bucket_start(i) // SUB_BUCKETS)
+
+    # durations past the last bucket go into it
+    last = bucket_start(N_BUCKETS - 1)
+    assert bucket_index(last) == N_BUCKETS - 1
+    assert bucket_index(last - 1) == N_BUCKETS - 2
+    assert bucket_index(100 * last) == bucket_index(2 ** 100) == N_BUCKETS - 1
+
+
+def histogram(values) -> LatencyHistogram:
+    h = LatencyHistogram(budget=1000)
+    for ns in values:
+        h.record(int(ns))
+    return h
+
+
+def test_percentile_exact():
+    h = histogram(range(1, 11))
+    assert [h.percentile(q) for q in (0, 10, 50, 55, 90, 100)] == [1, 1, 5, 6, 9, 10]
+    assert (h.count, h.total, h.max, h.overruns) == (10, 55, 10, 0)
+
+
+@pytest.mark.parametrize('distribution', ['uniform', 'lognormal', 'constant'])
+def test_percentile(distribution):
+    """The percentile is the end of the bucket of the exact percentile, at most 12.5% above it, and the maximum at
+    q=100."""
+    rng = np.random.default_rng(0)
+    values = {'uniform': rng.integers(10 ** 3, 10 ** 6, 5000),
+              'lognormal': rng.lognormal(14, 1, 5000).astype(int),
+              'constant': np.full(100, 123456)}[distribution]
+    h = histogram(values)
+    for q in [0, 1, 10, 25, 50, 75, 90, 99, 99.9, 100]:
+        exact = int(np.percentile(values, q, method='inverted_cdf'))
+        assert exact <= h.percentile(q) <= min(exact * (1 + 1 / SUB_BUCKETS), values.max())
+    assert h.percentile(0) < bucket_start(bucket_index(int(values.min())) + 1)
+    assert h.percentile(100) == h.max == values.max()
+    assert h.overruns == np.sum(values > 1000)
+
+
+def test_percentile_empty():
+    h = LatencyHistogram(budget=1000)
+    assert [h.percentile(q) for q in (0, 50, 100)] == [0, 0, 0]
@@ -0,0 +1,77 @@
+import numpy as np
+import pygame
+import pytest
+from pygame import Surface
+
+from .benchmarks.tracks import synthetic_track
+from .dustrider import Dustrider
+from .overlay import Overlay
+
+ZOOM = 0.25
+SIZE = (1200, 1000)
+
+
+class Counting:
+    """A render function that counts its calls."""
+
+    def __init__(self, render):
+        self.render = render
+        self.calls = 0
+
+    def __call__(self, surface, zoom):
+        self.calls += 1
+        self.render(surface, zoom)
+
+
+@pytest.fixture(autouse=True)
+def font():
+    pygame.font.init()
+
+
+def test_cache():
+    render = Counting(lambda surface, zoom: pygame.draw.circle(surface, (200, 0, 0), (50 * zoom, 50 * zoom), 5))
+    overlay = Overlay(render)
+    for _ in range(3):
+        map_scaled = Surface((100, 100))
+        overlay.draw(map_scaled, 1.)
+        assert map_scaled.get_at((50, 50))[:3] == (200, 0, 0)
+        assert map_scaled.get_at((10, 10))[:3] == (0, 0, 0)
+    assert render.calls == 1
+
+    # a new zoom or map size is rendered again, once
+    for size, zoom, calls in [((100, 100), 1.5, 2), ((100, 100), 1.5, 2), ((120, 100), 1.5, 3), ((100, 100), 1., 4)]:
+        map_scaled = Surface(size)
+        overlay.draw(map_scaled, zoom)
+        assert render.calls == calls
+        assert map_scaled.get_at((int(50 * zoom), int(50 * zoom)))[:3] == (200, 0, 0)
+
+
+def draw(bot: Dustrider) -> np.ndarray:
+    map_scaled = Surface(SIZE)
+    map_scaled.fill((255, 255, 255))
+    bot.draw(map_scaled, ZOOM)
+    return pygame.surfarray.array3d(map_scaled)
+
+
+def test_bot_overlay():
+    bot = Dustrider(synthetic_track(seed=0))
+    bot.init()
+    bot.overlay.render = render = Counting(bot.overlay.render)
+    labels = draw(bot)
+    assert np.any(labels != 255)
+    np.testing.assert_array_equal(draw(bot), labels)
+    assert render.calls == 1
+
+    # the plan is drawn over the overlay every frame
+    for y in (100, 300):
+        bot.simulation = np.array([[100., y], [4000., y]])
+        pixels = draw(bot)
+        assert np.all(pixels[30:900, int(y * ZOOM)] == 0)
+        assert not np.all(labels[30:900, int(y * ZOOM)] == 0)
+    assert render.calls == 1
+
+    # a bot on another track renders its overlay again in init
+    bot.simulation = np.empty((0, 2))
+    bot.track = synthetic_track(seed=1)
+    bot.init()
+    assert not np.array_equal(draw(bot), labels)
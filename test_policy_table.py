@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from pygame import Vector2
+
+from . import policy_table
+from .benchmarks.tracks import synthetic_track
+from .dustrider import Dustrider
+from .headless import start_position
+from .policy_table import PolicyTable, state_axes, track_state
+from ...linear_math import Rotation, Transform
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    """A Dustrider with planner='table' and a coarse table on a short track."""
+    monkeypatch.setattr(policy_table, 'SIZES', (3, 3, 5, 3, 3))
+    bot = Dustrider(synthetic_track(10, seed=1))
+    bot.config.planner = 'table'
+    PolicyTable.of(bot, workers=1)
+    bot.init()
+    return bot
+
+
+def table_axes(table: PolicyTable):
+    lows = np.array(table.lows)
+    return state_axes(lows, lows + np.array(table.steps) * (np.array(table.sizes) - 1))
+
+
+def grid_state(table: PolicyTable, waypoint: int, index) -> tuple:
+    """The car state of a grid state of the table."""
+    axes = table_axes(table)
+    progress, lateral, heading, speed, slip = (a[i] for a, i in zip(axes, index))
+    geometry = table.geometry
+    start, tangent, normal = geometry.points[waypoint - 1], geometry.tangents[waypoint], geometry.normals[waypoint]
+    p = start + progress * (geometry.points[waypoint] - start) + lateral * normal
+    forward = np.cos(heading) * tangent + np.sin(heading) * normal
+    side = np.array([-forward[1], forward[0]])
+    rotation = Rotation.fromangle(np.arctan2(forward[1], forward[0]))
+    return waypoint, Transform(rotation, Vector2(*p)), Vector2(*(speed * forward + slip * side))
+
+
+def test_build(bot):
+    table = bot.policy_table
+    assert table.throttle.shape == (len(bot.track.lines),) + policy_table.SIZES
+    assert table.steering_command.shape == table.throttle.shape
+    assert np.all(np.isin(table.throttle, np.linspace(-1, 1, bot.config.n_throttle)))
+    assert np.all(np.isin(table.steering_command, np.linspace(-1, 1, bot.config.n_steering)))
+    assert all(step > 0 for step in table.steps)
+
+
+@pytest.mark.parametrize('index', [(0, 0, 0, 0, 0), (1, 1, 2, 1, 1), (2, 0, 4, 2, 1), (1, 2, 3, 0, 2)])
+def test_lookup_is_grid_search(bot, index):
+    """At the grid states, the table holds the commands of the live grid search, with and without interpolation."""
+    for waypoint in (0, 3, len(bot.track.lines) - 1):
+        state = grid_state(bot.policy_table, waypoint, index)
+        np.testing.assert_allclose(track_state(bot.geometry, *state),
+                                   [a[i] for a, i in zip(table_axes(bot.policy_table), index)], atol=1e-9)
+        commands, _, _ = bot.search_grid(*state, 1 / 60)
+        assert bot.policy_table.lookup(*state) == tuple(commands[:, 0])
+        bot.policy_table.interpolate = True
+        assert bot.policy_table.lookup(*state) == pytest.approx(tuple(commands[:, 0]))
+        bot.policy_table.interpolate = False
+
+
+def test_fallback(bot):
+    """States off the table are searched live."""
+    position, _, next_waypoint = start_position(bot.track)
+    velocity = Vector2(1e4, 0)
+    assert bot.policy_table.lookup(next_waypoint, position, velocity) is None
+    commands, _, _ = bot.search(next_waypoint, position, velocity)
+    assert bot.candidates_evaluated == bot.config.n_throttle * bot.config.n_steering
+    bot.config.planner = 'grid'
+    np.testing.assert_array_equal(bot.search(next_waypoint, position, velocity)[0], commands)
+
+
+def test_table_hit(bot):
+    state = grid_state(bot.policy_table, 2, (1, 1, 2, 1, 1))
+    throttle, steering_command = bot.compute_commands(*state)
+    assert bot.candidates_evaluated == 0
+    assert (throttle, steering_command) == bot.policy_table.lookup(*state)
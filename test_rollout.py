@@ -0,0 +1,69 @@
+from copy import deepcopy
+
+import numpy as np
+import pytest
+from pygame import Vector2
+
+from .benchmarks.tracks import synthetic_track
+from .geometry import TrackGeometry
+from .headless import start_position
+from .rollout import Rollout
+from ...car_info import CarPhysics
+from ...linear_math import Rotation, Transform
+
+DT = 1 / 60
+
+
+def start_states(track, size: int, rng: np.random.Generator):
+    """States around the start, at speed and with up to the full speed sideways."""
+    position, _, next_waypoint = start_position(track)
+    states = []
+    for _ in range(size):
+        heading = rng.uniform(-np.pi, np.pi)
+        p = Vector2(position.p) + Vector2(*rng.uniform(-40, 40, 2))
+        velocity = Vector2(rng.uniform(0, 400), 0).rotate_rad(heading + rng.uniform(-np.pi / 2, np.pi / 2))
+        states.append((next_waypoint, Transform(Rotation.fromangle(heading), p), velocity))
+    return states
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_matches_car_physics(seed):
+    """Every candidate drives like CarPhysics with the game's waypoint rule, including the sideways slip."""
+    rng = np.random.default_rng(seed)
+    track = synthetic_track(seed=seed)
+    geometry = TrackGeometry.of(track)
+    size, n = 16, 60
+    states = start_states(track, size, rng)
+    throttle = rng.uniform(-1.5, 1.5, (size, n))
+    steering_command = rng.uniform(-1.5, 1.5, (size, n))
+
+    rollout = Rollout(geometry, geometry.target_speeds(1.), size, n)
+    rollout.reset_states(np.array([w for w, _, _ in states]),
+                         np.array([tuple(position.p) for _, position, _ in states]),
+                         np.array([tuple(position.M.cols[0]) for _, position, _ in states]),
+                         np.array([tuple(velocity) for _, _, velocity in states]))
+    rollout.advance(DT, throttle, steering_command)
+
+    for car, (next_waypoint, position, velocity) in enumerate(states):
+        physics = CarPhysics(deepcopy(position), Vector2(velocity))
+        for i in range(n):
+            physics.update(DT, throttle[car, i], steering_command[car, i])
+            if (track.lines[next_waypoint] - physics.position.p).length() < track.track_width:
+                next_waypoint = (next_waypoint + 1) % len(track.lines)
+            np.testing.assert_allclose(rollout.trajectory[i + 1, car], tuple(physics.position.p), rtol=1e-9)
+        np.testing.assert_allclose(rollout.heading[car], tuple(physics.position.M.cols[0]), rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(rollout.v[car], tuple(physics.velocity), rtol=1e-9, atol=1e-9)
+        assert rollout.next_waypoint[car] == next_waypoint
+
+
+def test_reset_from_one_state():
+    track = synthetic_track()
+    geometry = TrackGeometry.of(track)
+    next_waypoint, position, velocity = start_states(track, 1, np.random.default_rng(2))[0]
+    start, speed = Vector2(position.p), Vector2(velocity)
+    rollout = Rollout(geometry, geometry.target_speeds(1.), 3, 10)
+    rollout.simulate(next_waypoint, position, velocity, np.ones(3), np.zeros(3), DT)
+    # the inputs are not modified, and the same commands drive the same trajectory
+    assert position.p == start and velocity == speed
+    assert tuple(rollout.trajectory[0, 0]) == tuple(start)
+    np.testing.assert_array_equal(rollout.trajectory[:, 0], rollout.trajectory[:, 2])
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from pygame import Vector2
+
+from .benchmarks.tracks import synthetic_track
+from .geometry import TrackGeometry
+from .spatial import MAX_SCAN, PointIndex
+from .spline import CatmullRomSpline
+
+
+@pytest.fixture(scope='module')
+def points():
+    """A ring of several thousand points, so that ranges can be longer than MAX_SCAN."""
+    spline = CatmullRomSpline(TrackGeometry.of(synthetic_track(50, seed=3)).points, 1.0)
+    points, _ = spline.sample(2., endpoint=False)
+    assert len(points) > 2 * MAX_SCAN
+    return points
+
+
+def brute_force(points, p, start=None, end=None) -> int:
+    candidates = np.arange(len(points))
+    if start is not None:
+        candidates = np.arange(start, start + ((end - start) % len(points) or len(points))) % len(points)
+    return int(candidates[np.argmin(np.hypot(*(points[candidates] - (p.x, p.y)).T))])
+
+
+def queries(points, rng, count: int):
+    """Positions on the track, near it and far off it, which ends up outside of the grid, with random hints."""
+    low, high = points.min(axis=0), points.max(axis=0)
+    for scale in [10., 100., 1000., 1e5]:
+        for _ in range(count):
+            p = points[rng.integers(len(points))] + rng.normal(0, scale, 2)
+            yield Vector2(*p), [None, int(rng.integers(len(points)))][rng.integers(2)]
+    for _ in range(count):
+        yield Vector2(*rng.uniform(low - 500, high + 500)), None
+
+
+def test_nearest(points):
+    rng = np.random.default_rng(0)
+    index = PointIndex(points)
+    n = len(points)
+    for p, hint in queries(points, rng, 50):
+        assert index.nearest(p, hint) == brute_force(points, p)
+        # a short range is compared directly, a long one, which may wrap, is searched with the grid
+        for count in [10, MAX_SCAN, MAX_SCAN + 1, n // 2, n]:
+            start = int(rng.integers(n))
+            end = (start + count) % n
+            assert index.nearest(p, hint, start, end) == brute_force(points, p, start, end)
+
+
+def test_nearest_along(points):
+    rng = np.random.default_rng(1)
+    index = PointIndex(points)
+    n = len(points)
+    for p, hint in queries(points, rng, 20):
+        start = int(rng.integers(n))
+        end = (start + int(rng.integers(1, 100))) % n
+        closest = brute_force(points, p, start, end)
+        if np.hypot(*(points[closest] - (p.x, p.y))) > 50:
+            closest = brute_force(points, p, (end - n // 2) % n, end)
+        assert index.nearest_along(p, hint, start, end, 50) == closest
@@ -0,0 +1,98 @@
+from importlib import import_module
+from math import sqrt
+
+import numpy as np
+import pytest
+from pygame import Vector2
+
+from . import spline_bot2
+from .benchmarks.tracks import synthetic_track
+from .headless import start_position
+from .speed_profile import RangeMinimum
+
+
+def window_limit(bot, closest):
+    """The braking limit loop RoadSprinter2 ran every frame before it had a path with an arc length table."""
+    n = len(bot.points)
+    distance, min_speed, corner_index = 0., float('inf'), 0
+    for i in range(closest, closest + min(bot.config.speed_window, n)):
+        i %= n
+        distance += float(np.hypot(*(bot.points[i] - bot.points[i - 1])))
+        if distance < bot.config.speed_lookahead:
+            continue
+        max_speed = sqrt(bot.target_speeds[i] ** 2 + 2 * bot.config.deceleration * distance)
+        if max_speed < min_speed:
+            min_speed, corner_index = max_speed, i
+    return min_speed, corner_index
+
+
+@pytest.mark.parametrize('speed_window, speed_lookahead', [(100, 100), (5, 100), (100000, 100), (100, 0), (20, 1000)])
+def test_road_sprinter2_window(speed_window, speed_lookahead):
+    """The precomputed braking limits are those of the loop, at every closest point."""
+    bot = spline_bot2.RoadSprinter(synthetic_track(seed=4))
+    bot.config.speed_window = speed_window
+    bot.config.speed_lookahead = speed_lookahead
+    bot.init()
+    for closest in range(len(bot.points)):
+        speed, corner = bot.braking_limit(closest)
+        expected_speed, expected_corner = window_limit(bot, closest)
+        assert speed == pytest.approx(expected_speed, rel=1e-12)
+        assert corner == expected_corner
+
+
+def calculate_radius(p0, p1, p2):
+    a = (p2 - p1).length()
+    b = (p0 - p2).length()
+    c = (p0 - p1).length()
+    area = 0.5 * abs(p0.x * (p1.y - p2.y) + p1.x * (p2.y - p0.y) + p2.x * (p0.y - p1.y))
+    return a * b * c / (4 * area)
+
+
+def calculate_target_speed(track, position, next_waypoint, target_speeds, deceleration, window=10):
+    """calculate_target_speed, which the bots ran every frame before they had a speed profile, with the window size as
+    a parameter."""
+    min_speed = float('inf')
+    waypoint_distance = 0
+    for i in range(next_waypoint, next_waypoint + window):
+        i %= len(track.lines)
+        if i == next_waypoint:
+            waypoint_distance = (track.lines[i] - position.p).length()
+        else:
+            waypoint_distance += (track.lines[i] - track.lines[i - 1]).length()
+        min_speed = min(min_speed, sqrt(target_speeds[i] ** 2 + 2 * deceleration * waypoint_distance))
+    return min_speed
+
+
+@pytest.mark.parametrize('name', ['PID', 'PurePursuit', 'RoadRunner', 'RoadSprinter'])
+@pytest.mark.parametrize('speed_window', [10, 1, 3, 50, 1000])
+def test_target_speeds(name, speed_window):
+    """The corner speeds are corner_slow_down times calculate_radius, and the profile is calculate_target_speed with
+    the same window; the default window of 10 waypoints is the one the bots had."""
+    track = synthetic_track(seed=6)
+    bot = getattr(import_module(__package__), name)(track)
+    assert bot.config.speed_window == 10
+    bot.config.speed_window = speed_window
+    bot.init()
+    lines = track.lines
+    corner_speeds = [bot.config.corner_slow_down * calculate_radius(lines[i - 1], lines[i], lines[(i + 1) % len(lines)])
+                     for i in range(len(lines))]
+    np.testing.assert_allclose(bot.target_speeds, corner_speeds, rtol=1e-12)
+
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        position, _, _ = start_position(track)
+        next_waypoint = int(rng.integers(len(lines)))
+        position.p = lines[next_waypoint - 1] + Vector2(*rng.uniform(-30, 30, 2))
+        expected = calculate_target_speed(track, position, next_waypoint, corner_speeds, bot.config.deceleration,
+                                          speed_window)
+        assert bot.speed_profile(position, next_waypoint) == pytest.approx(expected, rel=1e-9)
+
+
+def test_range_minimum():
+    rng = np.random.default_rng(0)
+    # few distinct values, so that there are ties
+    values = rng.integers(0, 20, 300).astype(float)
+    starts = rng.integers(0, 300, 1000)
+    ends = starts + 1 + rng.integers(0, 300 - starts)
+    first = [start + int(np.argmin(values[start:end])) for start, end in zip(starts, ends)]
+    np.testing.assert_array_equal(RangeMinimum(values).argmin(starts, ends), first)
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from .benchmarks.tracks import synthetic_track
+from .geometry import TrackGeometry
+from .spline import ArcLengthPath, CatmullRomSpline
+
+
+@pytest.fixture
+def spline():
+    return CatmullRomSpline(TrackGeometry.of(synthetic_track(seed=7)).points, alpha=0.5)
+
+
+def test_passes_through_points(spline):
+    segments = np.arange(len(spline))
+    np.testing.assert_allclose(spline.evaluate(segments, np.zeros(len(spline))), spline.p1, atol=1e-9)
+    np.testing.assert_allclose(spline.evaluate(segments, np.ones(len(spline))), spline.p2, atol=1e-9)
+
+
+@pytest.mark.parametrize('endpoint', [True, False])
+def test_sample(spline, endpoint):
+    points, starts = spline.sample(20., endpoint=endpoint)
+    assert starts[-1] == len(points)
+    np.testing.assert_allclose(points[starts[:-1]], spline.p1, atol=1e-9)
+    if endpoint:
+        np.testing.assert_allclose(points[starts[1:] - 1], spline.p2, atol=1e-9)
+
+    # equal steps of at most max_distance along every segment, measured on the sampled polyline
+    closed = np.concatenate([points, points[:1]])
+    steps = np.linalg.norm(np.diff(closed, axis=0), axis=1)
+    for start, end in zip(starts[:-1], starts[1:]):
+        segment = steps[start:end - 1] if endpoint else steps[start:end]
+        assert segment.max() <= 20. * 1.01
+        assert segment.max() - segment.min() < 0.05 * segment.max()
+
+
+def test_sample_limits(spline):
+    _, starts = spline.sample(1e6, min_points=4)
+    assert np.all(np.diff(starts) == 4)
+    _, starts = spline.sample(1e-3, max_points=16)
+    assert np.all(np.diff(starts) == 16)
+
+
+@pytest.fixture
+def path(spline):
+    points, _ = spline.sample(30., endpoint=False)
+    return ArcLengthPath(points)
+
+
+def distance_along(path, start: int, point: np.ndarray, k: int) -> float:
+    """Arc length from sample start to a point on the segment that ends at sample k."""
+    s = path.arc_length[k - 1 if k else path.n - 1] + np.linalg.norm(point - path.points[k - 1])
+    return (s - path.arc_length[start]) % path.length
+
+
+def test_point_at(path):
+    rng = np.random.default_rng(0)
+    for start, distance in zip(rng.integers(path.n, size=100), rng.uniform(0, path.length, 100)):
+        point, k = path.point_at(int(start), float(distance))
+        assert distance_along(path, int(start), point, k) == pytest.approx(distance, abs=1e-6)
+    assert path.arc_length[-1] == pytest.approx(path.length)
+
+
+def test_point_at_edges(path):
+    np.testing.assert_array_equal(path.point_at(3, 0.)[0], path.points[3])
+    np.testing.assert_array_equal(path.point_at(3, -1.)[0], path.points[3])
+    # at most one lap
+    np.testing.assert_allclose(path.point_at(3, 2.5 * path.length)[0], path.points[3], atol=1e-6)
+    # across the end of the lap
+    point, k = path.point_at(path.n - 1, 1.5 * np.linalg.norm(path.points[0] - path.points[-1]))
+    assert k == 1
+
+
+def test_points_at(path):
+    rng = np.random.default_rng(1)
+    starts = rng.integers(path.n, size=200)
+    distances = np.concatenate([rng.uniform(0, 1.2 * path.length, 198), [0., -5.]])
+    expected = np.array([path.point_at(int(start), float(distance))[0] for start, distance in zip(starts, distances)])
+    np.testing.assert_allclose(path.points_at(starts, distances), expected, rtol=1e-12)
@@ -0,0 +1,78 @@
+import numpy as np
+
+from .telemetry import Channel, Recorder, Telemetry, encode, read
+
+
+def test_ring_wraparound():
+    channel = Channel(0, 'bot', ('a', 'b'), capacity=4)
+    for i in range(10):
+        channel.record(i, -i)
+    records = channel.take()
+    # only the newest records fit, the others are counted as dropped
+    np.testing.assert_array_equal(records['a'], [6, 7, 8, 9])
+    np.testing.assert_array_equal(records['b'], [-6, -7, -8, -9])
+    assert channel.dropped == 6
+    assert np.all(np.diff(records['time']) >= 0)
+
+    for i in range(10, 13):
+        channel.record(i, -i)
+    np.testing.assert_array_equal(channel.take()['a'], [10, 11, 12])
+    assert channel.dropped == 6
+    assert len(channel.take()) == 0
+
+
+def test_skip():
+    channel = Channel(0, 'bot', ('a',), capacity=4)
+    channel.record(1)
+    channel.skip()
+    channel.record(2)
+    np.testing.assert_array_equal(channel.take()['a'], [2])
+    assert channel.dropped == 0
+
+
+def test_encode():
+    channel = Channel(3, 'bot', ('a',), capacity=20000)
+    for i in range(20000):
+        channel.record(i)
+    recorder = Recorder()
+    packets = list(encode(channel, channel.take()))
+    # the data does not fit into one packet
+    assert len(packets) > 2
+    # data before the schema can not be decoded
+    assert recorder.feed(packets[1]) is None
+    for packet in packets:
+        recorder.feed(packet)
+    np.testing.assert_array_equal(recorder.records()['bot']['a'], np.arange(20000))
+
+
+def test_file_sink(tmp_path):
+    telemetry = Telemetry(capacity=8, interval=60.)
+    channel = telemetry.channel('bot', ('a', 'b'))
+    assert telemetry.channel('bot', ('a', 'b')) is channel
+    telemetry.enable(str(tmp_path / 'race.tlm'))
+    for i in range(5):
+        channel.record(i, 2 * i)
+    telemetry.disable()
+    records = read(str(tmp_path / 'race.tlm'))['bot']
+    np.testing.assert_array_equal(records['b'], [0, 2, 4, 6, 8])
+
+
+def test_dropped(tmp_path):
+    """Records that the flush thread did not take before the ring was full are reported in the file."""
+    telemetry = Telemetry(capacity=4, interval=60.)
+    channel = telemetry.channel('bot', ('a',))
+    other = telemetry.channel('other', ('a',))
+    telemetry.enable(str(tmp_path / 'race.tlm'))
+    for i in range(10):
+        channel.record(i)
+    other.record(0)
+    telemetry.flush()
+    for i in range(10, 19):
+        channel.record(i)
+    telemetry.disable()
+
+    recorder = Recorder.of(str(tmp_path / 'race.tlm'))
+    np.testing.assert_array_equal(recorder.records()['bot']['a'], [6, 7, 8, 9, 15, 16, 17, 18])
+    # a running total, for every flush that dropped records
+    assert recorder.dropped == {'bot': 11}
+    assert channel.dropped == 11 and other.dropped == 0
@@ -0,0 +1,73 @@
+import json
+
+import numpy as np
+import pytest
+
+from . import tuning
+from .benchmarks.tracks import synthetic_track
+from .pid import PID
+
+SPACE = {'p': (1., 8.), 'd': (5., 20.)}
+
+
+def tuner(results_file, bot_class=PID, **kwargs) -> tuning.Tuner:
+    tracks = [synthetic_track(20, seed=0), synthetic_track(20, seed=1)]
+    return tuning.Tuner(bot_class, SPACE, tracks, str(results_file), max_time=2., workers=1, **kwargs)
+
+
+def test_resume(tmp_path, monkeypatch):
+    results_file = tmp_path / 'results.jsonl'
+    best_config, best_time = tuner(results_file).run(generations=2)
+    lines = results_file.read_text().splitlines()
+    # every (config, track) is raced once
+    keys = {json.dumps([record['config'], record['track']], sort_keys=True) for record in map(json.loads, lines)}
+    assert len(keys) == len(lines)
+
+    def race(*args, **kwargs):
+        raise AssertionError('a memoized race was run again')
+
+    # the same seed replays the generations from the file without racing
+    monkeypatch.setattr(tuning, 'race', race)
+    assert tuner(results_file).run(generations=2) == (best_config, best_time)
+    assert results_file.read_text().splitlines() == lines
+
+    # and a longer run continues where it stopped
+    monkeypatch.undo()
+    assert tuner(results_file).run(generations=3)[1] <= best_time
+    assert len(results_file.read_text().splitlines()) > len(lines)
+
+
+# another bot class with the same qualified name
+OtherPID = type('PID', (PID,), {})
+
+
+def test_resume_other_tuning(tmp_path, monkeypatch):
+    results_file = tmp_path / 'results.jsonl'
+    tuner(results_file).run(generations=0)
+
+    races = []
+    race = tuning.race
+    monkeypatch.setattr(tuning, 'race', lambda *args, **kwargs: races.append(args) or race(*args, **kwargs))
+    tuner(results_file).run(generations=0)
+    assert not races
+
+    # the default config is raced again on both tracks for another bot class, laps or max_time
+    tuner(results_file, OtherPID).run(generations=0)
+    assert len(races) == 2
+    tuner(results_file, laps=2).run(generations=0)
+    assert len(races) == 4
+    tuning.Tuner(PID, SPACE, [synthetic_track(20, seed=0)], str(results_file), max_time=1., workers=1).run(0)
+    assert len(races) == 5
+
+
+def test_to_config(tmp_path):
+    t = tuning.Tuner(PID, {'p': (1., 8.), 'n': (1, 10)}, [synthetic_track(20)], workers=1)
+    assert t.to_config(np.array([0.5, 0.5])) == {'p': 4.5, 'n': 6}
+    assert t.to_config(np.array([-1., 2.])) == {'p': 1., 'n': 10}
+
+
+def test_unfinished_score():
+    track = synthetic_track(20)
+    # a race that ends early scores between max_time and twice max_time, less the further the car got
+    assert tuning.evaluate(PID, {}, track, laps=1, max_time=.1) == pytest.approx(2 * .1)
+    assert 3. < tuning.evaluate(PID, {}, track, laps=1, max_time=3.) < 2 * 3.
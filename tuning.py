@@ -0,0 +1,157 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from math import log, sqrt
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+from .cache import track_id
+from .headless import race
+from ...bot import Bot
+from ...track import Track
+
+
+def evaluate(bot_class: Type[Bot], config: Dict[str, float], track: Track, laps: int, max_time: float) -> float:
+    """Race time of a bot with some config values overridden.
+
+    A bot that does not finish scores more than max_time, and less when it got further.
+    """
+    bot = bot_class(track)
+    vars(bot.config).update(config)
+    bot.init()
+    result = race(bot, track, laps=laps, max_time=max_time)
+    if result.finished:
+        return result.race_time
+    return max_time * (2 - len(result.splits) / (laps * len(track.lines)))
+
+
+def _evaluate(args) -> float:
+    return evaluate(*args)
+
+
+class Tuner:
+    """Tunes the config of a bot with CMA-ES, racing the candidates headless in a process pool.
+
+    `space` maps config fields to their (low, high) bounds; fields with integer bounds are rounded. The search starts
+    at the bot's current config. Every race is memoized per (config, track) and appended to `results_file`, which is
+    read back on the next run. Because the search is seeded, rerunning an interrupted tuning replays the evaluated
+    generations from the file and continues where it stopped. The records hold the bot class, laps and max_time, and
+    only those of the same tuning are read back.
+    """
+
+    def __init__(self, bot_class: Type[Bot], space: Dict[str, Tuple[float, float]], tracks: List[Track],
+                 results_file: Optional[str] = None, laps: int = 1, max_time: float = 300.,
+                 workers: Optional[int] = None, seed: int = 0):
+        self.bot_class = bot_class
+        self.bot = f'{bot_class.__module__}.{bot_class.__qualname__}'
+        self.space = space
+        self.tracks = tracks
+        self.track_ids = [track_id(track) for track in tracks]
+        self.results_file = results_file
+        self.laps = laps
+        self.max_time = max_time
+        self.workers = workers
+        self.rng = np.random.default_rng(seed)
+
+        self.low = np.array([low for low, _ in space.values()], dtype=float)
+        self.high = np.array([high for _, high in space.values()], dtype=float)
+        self.integer = np.array([isinstance(low, int) and isinstance(high, int) for low, high in space.values()])
+
+        self.results = {}
+        if results_file:
+            try:
+                with open(results_file) as f:
+                    for line in f:
+                        record = json.loads(line)
+                        # records of another bot class, laps or max_time
+                        if [record.get(name) for name in ('bot', 'laps', 'max_time')] != [self.bot, laps, max_time]:
+                            continue
+                        self.results[self.key(record['config'], record['track'])] = record['time']
+            except FileNotFoundError:
+                pass
+
+    def key(self, config: Dict[str, float], track: str) -> str:
+        return json.dumps([track, sorted(config.items())])
+
+    def to_config(self, x: np.ndarray) -> Dict[str, float]:
+        """Map a point of the unit cube to config values."""
+        values = self.low + np.clip(x, 0, 1) * (self.high - self.low)
+        return {name: int(round(value)) if integer else float(value)
+                for name, value, integer in zip(self.space, values, self.integer)}
+
+    def evaluate(self, configs: List[Dict[str, float]]) -> np.ndarray:
+        """Total race time over all tracks of every config, only racing what has not been raced before."""
+        jobs = {}
+        for config in configs:
+            for track, h in zip(self.tracks, self.track_ids):
+                key = self.key(config, h)
+                if key not in self.results and key not in jobs:
+                    jobs[key] = (config, track, h)
+
+        if jobs:
+            args = [(self.bot_class, config, track, self.laps, self.max_time) for config, track, _ in jobs.values()]
+            if self.workers == 1:
+                times = list(map(_evaluate, args))
+            else:
+                with ProcessPoolExecutor(self.workers) as pool:
+                    times = list(pool.map(_evaluate, args))
+
+            for (key, (config, _, h)), time in zip(jobs.items(), times):
+                self.results[key] = time
+                if self.results_file:
+                    with open(self.results_file, 'a') as f:
+                        f.write(json.dumps({'bot': self.bot, 'laps': self.laps, 'max_time': self.max_time,
+                                            'config': config, 'track': h, 'time': time}) + '\n')
+
+        return np.array([sum(self.results[self.key(config, h)] for h in self.track_ids) for config in configs])
+
+    def run(self, generations: int, sigma: float = 0.2) -> Tuple[Dict[str, float], float]:
+        """Run CMA-ES in the unit cube and return the best config and its total race time."""
+        n = len(self.space)
+        default = vars(self.bot_class(self.tracks[0]).config)
+        mean = np.clip((np.array([default[name] for name in self.space], dtype=float) - self.low) /
+                       (self.high - self.low), 0, 1)
+
+        # default strategy parameters
+        population = 4 + int(3 * log(n))
+        mu = population // 2
+        weights = log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+        weights /= weights.sum()
+        mueff = 1 / np.sum(weights ** 2)
+        cc = (4 + mueff / n) / (n + 4 + 2 * mueff / n)
+        cs = (mueff + 2) / (n + mueff + 5)
+        c1 = 2 / ((n + 1.3) ** 2 + mueff)
+        cmu = min(1 - c1, 2 * (mueff - 2 + 1 / mueff) / ((n + 2) ** 2 + mueff))
+        damps = 1 + 2 * max(0., sqrt((mueff - 1) / (n + 1)) - 1) + cs
+        chi_n = sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+
+        pc, ps = np.zeros(n), np.zeros(n)
+        B, D, C = np.eye(n), np.ones(n), np.eye(n)
+
+        best_config = self.to_config(mean)
+        best_time = self.evaluate([best_config])[0]
+        for generation in range(generations):
+            y = self.rng.standard_normal((population, n)) @ (B * D).T
+            configs = [self.to_config(x) for x in mean + sigma * y]
+            times = self.evaluate(configs)
+
+            order = np.argsort(times)
+            if times[order[0]] < best_time:
+                best_config, best_time = configs[order[0]], times[order[0]]
+
+            y_w = weights @ y[order[:mu]]
+            mean = mean + sigma * y_w
+
+            ps = (1 - cs) * ps + sqrt(cs * (2 - cs) * mueff) * (B @ ((B.T @ y_w) / D))
+            hsig = np.linalg.norm(ps) / sqrt(1 - (1 - cs) ** (2 * (generation + 1))) / chi_n < 1.4 + 2 / (n + 1)
+            pc = (1 - cc) * pc + hsig * sqrt(cc * (2 - cc) * mueff) * y_w
+
+            selected = y[order[:mu]]
+            C = ((1 - c1 - cmu) * C + c1 * (np.outer(pc, pc) + (1 - hsig) * cc * (2 - cc) * C) +
+                 cmu * (selected.T * weights) @ selected)
+            sigma *= np.exp((cs / damps) * (np.linalg.norm(ps) / chi_n - 1))
+
+            D2, B = np.linalg.eigh((C + C.T) / 2)
+            D = np.sqrt(np.maximum(D2, 1e-20))
+
+        return best_config, float(best_time)